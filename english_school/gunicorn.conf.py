@@ -0,0 +1,18 @@
+import logging
+
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def post_worker_init(worker):
+    from django.conf import settings
+    from django.core.management import call_command
+
+    # The first worker fills the shared cache after a deploy, the others
+    # already serve meanwhile.
+    if worker.age != 1 or not settings.CACHE_WARMUP_ON_BOOT:
+        return
+    try:
+        call_command("warm_cache")
+    except Exception as e:
+        logger.error(f">>> Failed to warm the cache: {e}")
@@ -1,16 +1,28 @@
+import io
 import csv
 import logging
-import datetime
 
-from django.contrib import admin
-from django.conf import settings
-from django.http import HttpResponse
+from itertools import islice
+from urllib.parse import quote
+
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AdminFileWidget
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Count, Q
+from django.db.models.fields.files import FieldFile
+from django.forms.models import BaseInlineFormSet, ModelChoiceField
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.html import mark_safe
 from django.utils.crypto import get_random_string
 from django.utils.translation import gettext_lazy as _
-from django.core.mail import send_mail, BadHeaderError
 
 from parler.admin import TranslatableAdmin, TranslatableStackedInline
+from parler.cache import get_translation_cache_key, is_missing
+from parler.forms import TranslatableBaseInlineFormSet, TranslatableModelForm
 from jet.dashboard.dashboard import Dashboard, AppIndexDashboard
 from jet.dashboard.dashboard_modules import google_analytics
 
@@ -25,8 +37,17 @@ from .models import (
     TeacherCertificate,
     TeacherNote,
     TeacherEducation,
-    Teacher
+    Teacher,
+    OutboxEmail,
+    Newsletter,
+    NewsletterDelivery,
+    AssetDeletion
     )
+from .compression import iter_gzip
+from .media import cloudinary_url, file_url
+from .search import INDEXED_MODELS, search_ids
+from .signals import invalidate_cached_responses, update_search_index
+from .newsletter import queue_newsletter
 from writingApp.models import TextEditor
 
 
@@ -45,37 +66,151 @@ class CustomIndexDashboard(Dashboard):
             google_analytics.GoogleAnalyticsPeriodVisitors)
 
 
-def export_to_csv(modeladmin, request, queryset):
-    opts = modeladmin.model._meta
-    content_disposition = f"attachment; filename={opts.verbose_name}.csv"
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = content_disposition
-    writer = csv.writer(response)
-    fields = [
-        field
-        for field in opts.get_fields()
-        if not field.many_to_many and not field.one_to_many
+EXPORT_CHUNK_SIZE = 2000
+
+
+def format_export_date(value):
+    return value and value.strftime("%d/%m/%Y")
+
+
+def export_columns(model):
+    """
+    Return the (header, values_list lookup, converter) of every column.
+    Relations are exported through the related username or primary key,
+    joined in the same query.
+    """
+    columns = []
+    for field in model._meta.concrete_fields:
+        lookup = field.name
+        if field.is_relation:
+            related = field.related_model
+            lookup += "__" + getattr(
+                related, "USERNAME_FIELD", related._meta.pk.name)
+        convert = None
+        if isinstance(field, models.DateTimeField):
+            convert = format_export_date
+        columns.append((field.verbose_name, lookup, convert))
+    return columns
+
+
+def iter_csv(model, queryset):
+    """
+    Yield the CSV export of ``queryset`` one chunk of rows at a time.
+    """
+    columns = export_columns(model)
+    converters = [
+        (index, convert)
+        for index, (_header, _lookup, convert) in enumerate(columns)
+        if convert
     ]
-    # Write a first row with header information
-    writer.writerow([field.verbose_name for field in fields])
-    # Write data rows
-    for obj in queryset:
-        data_row = []
-        for field in fields:
-            value = getattr(obj, field.name)
-            if isinstance(value, datetime.datetime):
-                value = value.strftime("%d/%m/%Y")
-            data_row.append(value)
-        writer.writerow(data_row)
+    rows = queryset.values_list(
+        *(lookup for _header, lookup, _convert in columns)
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _lookup, _convert in columns])
+    while chunk := list(islice(rows, EXPORT_CHUNK_SIZE)):
+        if converters:
+            chunk = [list(row) for row in chunk]
+            for row in chunk:
+                for index, convert in converters:
+                    row[index] = convert(row[index])
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_csv(modeladmin, queryset, compress=False):
+    opts = modeladmin.model._meta
+    content = iter_csv(modeladmin.model, queryset)
+    if compress:
+        response = StreamingHttpResponse(
+            iter_gzip(chunk.encode() for chunk in content),
+            content_type="application/gzip")
+        filename = f"{opts.verbose_name}.csv.gz"
+    else:
+        response = StreamingHttpResponse(content, content_type="text/csv")
+        filename = f"{opts.verbose_name}.csv"
+    # RFC 5987, the verbose names are not ASCII.
+    response["Content-Disposition"] = (
+        f"attachment; filename*=utf-8''{quote(filename)}")
     return response
 
 
+def export_to_csv(modeladmin, request, queryset):
+    return stream_csv(modeladmin, queryset)
+
+
 export_to_csv.short_description = _("Експорт у CSV")
 
 
+def export_to_csv_gzip(modeladmin, request, queryset):
+    return stream_csv(modeladmin, queryset, compress=True)
+
+
+export_to_csv_gzip.short_description = _("Експорт у CSV (gzip)")
+
+
+class TranslatedChangeList(ChangeList):
+    def get_queryset(self, request, *args, **kwargs):
+        queryset = super().get_queryset(request, *args, **kwargs)
+        return queryset.prefetch_translations(
+            *self.model_admin.list_prefetch_translations)
+
+
+class TranslatedListMixin:
+    """
+    Changelist of a translatable model that loads the translations of the
+    shown page in one query, and those of the translated relations in
+    ``list_prefetch_translations`` (select them in
+    ``list_select_related``) in one more query each.
+    """
+
+    list_prefetch_translations = []
+
+    def get_changelist(self, request, **kwargs):
+        return TranslatedChangeList
+
+
+class TranslatedRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Related filter whose choices, named by a translated field, are listed
+    with their translations prefetched.
+    """
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        queryset = field.related_model._default_manager.complex_filter(
+            field.get_limit_choices_to()).prefetch_translations()
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return [(obj.pk, str(obj)) for obj in queryset]
+
+
+class IndexedSearchMixin:
+    """
+    Admin search of a model of main.search that also matches the rows
+    found by the full-text index, in any language. ``search_fields`` must
+    name translated fields through ``translations__``.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(
+                pk__in=search_ids(queryset, search_term))
+        return results, may_have_duplicates
+
+
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ["name", "token", "created_by", "updated_by"]
+    list_display = [
+        "name", "token", "read_rate", "write_rate", "created_by", "updated_by"
+    ]
     readonly_fields = ["token", "created_by", "updated_by"]
     actions = ["generate_new_token"]
 
@@ -101,8 +236,9 @@ class ServiceAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(TranslatableAdmin):
+class CategoryAdmin(TranslatedListMixin, TranslatableAdmin):
     list_display = ["name", "created_by", "updated_by"]
+    list_select_related = ["created_by", "updated_by"]
     readonly_fields = ["created_by", "updated_by"]
     search_fields = ["name"]
 
@@ -119,7 +255,8 @@ class CategoryAdmin(TranslatableAdmin):
 
 
 @admin.register(Course)
-class CourseAdmin(TranslatableAdmin):
+class CourseAdmin(
+        IndexedSearchMixin, TranslatedListMixin, TranslatableAdmin):
     list_display = [
         "name",
         "display_image",
@@ -150,8 +287,11 @@ class CourseAdmin(TranslatableAdmin):
         "group",
         ]
 
+    list_select_related = ["category"]
+    list_prefetch_translations = ["category"]
+
     def display_image(self, obj):
-        image = obj.image.url
+        image = file_url(obj.image)
         if image:
             return mark_safe(
                 f'<img src="{image}" width="80" height="100"\
@@ -163,15 +303,17 @@ class CourseAdmin(TranslatableAdmin):
         return {"slug": ("name",)}
 
     list_filter = [
-        "category", "available", "price_total"
+        ("category", TranslatedRelatedFieldListFilter),
+        "available",
+        "price_total"
         ]
 
+    # Names and descriptions are searched through the full-text index.
     search_fields = [
-        "name",
-        "category__name",
-        "time",
+        "category__translations__name",
+        "translations__time",
         "price_total",
-        "message"
+        "translations__message"
         ]
 
     def save_model(self, request, obj, form, change):
@@ -226,10 +368,10 @@ class MainPageAdmin(admin.ModelAdmin):
         if obj.video:
             if obj.video.resource_type == 'video':
                 return mark_safe(f'<video width="200" height="200" controls>\
-                                <source src="{obj.video.url}" \
+                                <source src="{cloudinary_url(obj.video)}" \
                                 type="video/mp4"></video>')
         elif obj.image:
-            return mark_safe(f'<img src="{obj.image.url}"\
+            return mark_safe(f'<img src="{file_url(obj.image)}"\
                             width="200" height="200"\
                 style="margin-right: 10px;" />')
         return "-"
@@ -287,7 +429,7 @@ class ContactAdmin(admin.ModelAdmin):
         "updated_by",
         ]
 
-    actions = ["mark_as_processed", export_to_csv]
+    actions = ["mark_as_processed", export_to_csv, export_to_csv_gzip]
 
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user
@@ -309,30 +451,328 @@ class SubscriptionEmailAdmin(admin.ModelAdmin):
     ]
 
     def send_custom_message(self, request, queryset):
-        selected_messages = TextEditor.objects.filter(is_selected=True)
-        recipient_list = [subscriber.email for subscriber in queryset]
-        from_email = settings.DEFAULT_FROM_EMAIL
-        try:
-            send_mail(
-                selected_messages.title,
-                selected_messages.content,
-                from_email,
-                recipient_list
-                )
-        except BadHeaderError as e:
-            logger.error(f"Invalid header found: {e}")
-        except Exception as e:
-            logger.error(f">>> Failed to send email: {e}")
-
-        self.message_user(request, _("Повідомлення надіслано успішно."))
+        text = TextEditor.objects.filter(is_selected=True).first()
+        if text is None:
+            self.message_user(
+                request,
+                _("Немає тексту, обраного для надсилання."),
+                messages.ERROR)
+            return
+
+        newsletter = queue_newsletter(
+            text.title, text.content, queryset, created_by=request.user)
+        self.message_user(
+            request,
+            _("Розсилку поставлено в чергу: %(count)d отримувачів.") % {
+                "count": newsletter.deliveries.count()})
 
     send_custom_message.short_description = _(
         "Надіслати вибраним електронну пошту")
 
-    actions = [export_to_csv, "send_custom_message"]
+    actions = [export_to_csv, export_to_csv_gzip, "send_custom_message"]
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = [
+        "subject",
+        "recipients",
+        "status",
+        "attempts",
+        "next_attempt",
+        "created",
+        "sent"
+        ]
+
+    list_filter = [
+        "status",
+        "created"
+        ]
+
+    readonly_fields = [
+        "subject",
+        "message",
+        "from_email",
+        "recipients",
+        "status",
+        "attempts",
+        "next_attempt",
+        "last_error",
+        "created",
+        "sent"
+        ]
+
+    actions = ["retry_now"]
+
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=OutboxEmail.SENT).update(
+            status=OutboxEmail.PENDING, next_attempt=timezone.now())
 
+    retry_now.short_description = _("Надіслати повторно")
 
-class TeacherNoteInline(TranslatableStackedInline):
+
+@admin.register(AssetDeletion)
+class AssetDeletionAdmin(admin.ModelAdmin):
+    list_display = [
+        "public_id",
+        "resource_type",
+        "status",
+        "attempts",
+        "next_attempt",
+        "created",
+        "deleted"
+        ]
+
+    list_filter = [
+        "status",
+        "resource_type",
+        "created"
+        ]
+
+    search_fields = [
+        "public_id"
+        ]
+
+    readonly_fields = [
+        "public_id",
+        "resource_type",
+        "status",
+        "attempts",
+        "next_attempt",
+        "last_error",
+        "created",
+        "deleted"
+        ]
+
+    actions = ["retry_now"]
+
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=AssetDeletion.DELETED).update(
+            status=AssetDeletion.PENDING, next_attempt=timezone.now())
+
+    retry_now.short_description = _("Видалити повторно")
+
+
+@admin.register(Newsletter)
+class NewsletterAdmin(admin.ModelAdmin):
+    list_display = [
+        "subject",
+        "status",
+        "pending",
+        "sent",
+        "failed",
+        "created",
+        "created_by",
+        "finished"
+        ]
+
+    list_filter = [
+        "status",
+        "created"
+        ]
+
+    readonly_fields = [
+        "status",
+        "created",
+        "created_by",
+        "finished"
+        ]
+
+    actions = ["retry_failed"]
+
+    def get_queryset(self, request):
+        deliveries = {
+            name: Count("deliveries", filter=Q(deliveries__status=status))
+            for name, status in (
+                ("pending_count", NewsletterDelivery.PENDING),
+                ("sent_count", NewsletterDelivery.SENT),
+                ("failed_count", NewsletterDelivery.FAILED),
+            )
+        }
+        return super().get_queryset(request).annotate(**deliveries)
+
+    @admin.display(description=_("Очікує"), ordering="pending_count")
+    def pending(self, obj):
+        return obj.pending_count
+
+    @admin.display(description=_("Надіслано"), ordering="sent_count")
+    def sent(self, obj):
+        return obj.sent_count
+
+    @admin.display(description=_("Помилка"), ordering="failed_count")
+    def failed(self, obj):
+        return obj.failed_count
+
+    def retry_failed(self, request, queryset):
+        NewsletterDelivery.objects.filter(
+            newsletter__in=queryset, status=NewsletterDelivery.FAILED
+        ).update(
+            status=NewsletterDelivery.PENDING,
+            attempts=0,
+            next_attempt=timezone.now(),
+            error="")
+        queryset.update(status=Newsletter.QUEUED, finished=None)
+
+    retry_failed.short_description = _("Надіслати повторно невдалі")
+
+
+class InlineObjectField(ModelChoiceField):
+    """
+    Primary key field of an inline form, looked up in the rows the formset
+    has already loaded instead of with a query per form.
+    """
+
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.formset._existing_object(
+                self.queryset.model._meta.pk.to_python(value))
+        except ValidationError:
+            obj = None
+        if obj is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
+
+class PrefetchedInlineFormSet(BaseInlineFormSet):
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields.get(name)
+        if type(field) is ModelChoiceField:
+            form.fields[name] = InlineObjectField(
+                self,
+                field.queryset,
+                initial=field.initial,
+                required=False,
+                widget=field.widget,
+            )
+
+
+class InlineTranslationForm(TranslatableModelForm):
+    """
+    Translatable inline form that only checks new translations for
+    duplicates. A stored translation keeps its language and row, checking
+    it would cost a query per form.
+    """
+
+    def _post_clean_translation(self, translation):
+        if translation._state.adding:
+            super()._post_clean_translation(translation)
+            return
+        exclude = self._get_translation_validation_exclusions(translation)
+        try:
+            translation.full_clean(exclude=exclude, validate_unique=False)
+        except ValidationError as e:
+            self._update_errors(e)
+
+    def validate_unique(self):
+        # The translations are checked above, skip them in the model check.
+        exclude = self._get_validation_exclusions()
+        try:
+            models.Model.validate_unique(self.instance, exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
+
+
+class BulkTranslationInlineFormSet(
+        PrefetchedInlineFormSet, TranslatableBaseInlineFormSet):
+    """
+    Inline formset that saves the translations of the edited rows with a
+    query per translation table instead of saving each row.
+    """
+
+    def save_existing_objects(self, commit=True):
+        if commit:
+            self.saved_forms = []
+        objects = super().save_existing_objects(commit=False)
+        if commit:
+            for obj in self.deleted_objects:
+                obj.delete()
+            self.save_translations(objects)
+            for form in self.saved_forms:
+                form.save_m2m()
+        return objects
+
+    def save_translations(self, objects):
+        translated = set(self.model._parler_meta.get_all_fields())
+        for obj, changed_data in self.changed_objects:
+            if set(changed_data) - translated:
+                obj.save()  # Not only translations changed.
+
+        for meta in self.model._parler_meta:
+            created, updated = [], []
+            for obj in objects:
+                local_cache = obj._translations_cache[meta.model]
+                for translation in local_cache.values():
+                    if is_missing(translation):
+                        continue
+                    if translation.pk is None:
+                        translation.master = obj
+                        created.append(translation)
+                    elif translation.is_modified:
+                        updated.append(translation)
+            meta.model.objects.bulk_create(created)
+            meta.model.objects.bulk_update(
+                updated, meta.get_translated_fields())
+            # Unlike save(), the bulk queries leave parler's cached
+            # translations (or "use the fallback" markers) in place.
+            cache.delete_many([
+                get_translation_cache_key(
+                    meta.model, translation.master_id,
+                    translation.language_code)
+                for translation in created + updated
+            ])
+
+        # The bulk queries send no signals.
+        if objects:
+            invalidate_cached_responses(self.model)
+        if self.model in INDEXED_MODELS:
+            for obj in objects:
+                update_search_index(self.model, obj)
+
+
+class MediaFile:
+    def __init__(self, field_file):
+        self.name = field_file.name
+        self.url = file_url(field_file)
+
+    def __str__(self):
+        return self.name
+
+
+class MediaFileWidget(AdminFileWidget):
+    """
+    File input linking the current file through the memoized media URL.
+    """
+
+    def is_initial(self, value):
+        return isinstance(value, (FieldFile, MediaFile)) and bool(value.name)
+
+    def format_value(self, value):
+        if isinstance(value, FieldFile) and self.is_initial(value):
+            return MediaFile(value)
+        return super().format_value(value)
+
+
+class PrefetchedTranslationsInline(TranslatableStackedInline):
+    form = InlineTranslationForm
+    formset = BulkTranslationInlineFormSet
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_translations()
+
+
+class TeacherNoteInline(PrefetchedTranslationsInline):
     model = TeacherNote
     readonly_fields = ('id',)
     extra = 1
@@ -340,18 +780,23 @@ class TeacherNoteInline(TranslatableStackedInline):
 
 class TeacherCertificateInline(admin.StackedInline):
     model = TeacherCertificate
+    formset = PrefetchedInlineFormSet
+    formfield_overrides = {
+        models.ImageField: {"widget": MediaFileWidget},
+    }
     readonly_fields = ('id',)
     extra = 1
 
 
-class TeacherEducationInline(TranslatableStackedInline):
+class TeacherEducationInline(PrefetchedTranslationsInline):
     model = TeacherEducation
     readonly_fields = ('id',)
     extra = 1
 
 
 @admin.register(Teacher)
-class TeacherAdmin(TranslatableAdmin):
+class TeacherAdmin(
+        IndexedSearchMixin, TranslatedListMixin, TranslatableAdmin):
     list_display = [
         'name',
         'display_image',
@@ -360,6 +805,10 @@ class TeacherAdmin(TranslatableAdmin):
         "updated",
         "updated_by"
         ]
+    list_select_related = ["updated_by"]
+    # Names, positions, educations and notes are searched through the
+    # full-text index.
+    search_fields = ["slug"]
     readonly_fields = [
         "created_by",
         "created",
@@ -373,7 +822,7 @@ class TeacherAdmin(TranslatableAdmin):
         ]
 
     def display_image(self, obj):
-        image = obj.image.url
+        image = file_url(obj.image)
         if image:
             return mark_safe(
                 f'<img src="{image}" width="80" height="100"\
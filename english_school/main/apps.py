@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 from django.utils.translation import gettext_lazy as _
 
 
@@ -6,3 +7,9 @@ class MainConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "main"
     verbose_name = _("Застосунки")
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .database import apply_sqlite_pragmas
+
+        connection_created.connect(apply_sqlite_pragmas)
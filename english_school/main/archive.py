@@ -0,0 +1,244 @@
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+
+from datetime import datetime, timedelta, timezone
+
+from .backup import snapshot_database
+
+
+# SQLite pages change in place, so fixed chunks aligned on whole pages
+# dedup well between snapshots.
+CHUNK_SIZE = 64 * 1024
+
+# An SQL dump shifts when a row is added, its chunks end after lines
+# picked by their checksum instead, about one line in 512.
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+BOUNDARY_MASK = 0x1FF
+
+
+def iter_chunks(source, content_defined=False):
+    if not content_defined:
+        while chunk := source.read(CHUNK_SIZE):
+            yield chunk
+        return
+
+    lines = []
+    size = 0
+    for line in source:
+        lines.append(line)
+        size += len(line)
+        if size >= MAX_CHUNK_SIZE or (
+            size >= MIN_CHUNK_SIZE
+            and not zlib.crc32(line) & BOUNDARY_MASK
+        ):
+            yield b"".join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield b"".join(lines)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class BackupArchive:
+    """
+    Content-addressed archive of database snapshots.
+
+    A snapshot is split into chunks (see iter_chunks) stored zlib-compressed
+    under ``chunks/<sha256>``, a chunk already in the archive is not stored
+    again.
+    ``snapshots/<name>.json`` lists the chunks of a snapshot in order,
+    together with its size and sha256.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def snapshot_path(self, name):
+        return os.path.join(self.snapshots_dir, f"{name}.json")
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+    def snapshots(self):
+        """
+        Return the snapshot names, oldest first.
+        """
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(
+            name[:-len(".json")]
+            for name in os.listdir(self.snapshots_dir)
+            if name.endswith(".json")
+        )
+
+    def stats(self):
+        """
+        Return the total size of the snapshots and the bytes stored for
+        them on disk.
+        """
+        size = sum(self.manifest(name)["size"] for name in self.snapshots())
+        stored = 0
+        for directory, _dirs, files in os.walk(self.chunks_dir):
+            stored += sum(
+                os.path.getsize(os.path.join(directory, name))
+                for name in files)
+        return size, stored
+
+    def manifest(self, name):
+        try:
+            with open(self.snapshot_path(name)) as manifest:
+                return json.load(manifest)
+        except FileNotFoundError:
+            raise ArchiveError(f"Snapshot {name} does not exist.")
+
+    def add(self, path, name=None, format="sqlite3"):
+        """
+        Store the file at ``path`` as a snapshot of ``format`` ("sqlite3"
+        or "sql"). Returns the manifest, with the number and compressed
+        size of the chunks it added.
+        """
+        created = datetime.now(timezone.utc)
+        name = name or created.strftime("%Y-%m-%dT%H-%M-%S")
+        if os.path.exists(self.snapshot_path(name)):
+            raise ArchiveError(f"Snapshot {name} already exists.")
+
+        file_hash = hashlib.sha256()
+        chunks = []
+        new_chunks = stored = size = 0
+        with open(path, "rb") as source:
+            for chunk in iter_chunks(source, format == "sql"):
+                size += len(chunk)
+                file_hash.update(chunk)
+                digest = hashlib.sha256(chunk).hexdigest()
+                chunks.append(digest)
+                chunk_path = self.chunk_path(digest)
+                if not os.path.exists(chunk_path):
+                    data = zlib.compress(chunk)
+                    self._write_atomic(chunk_path, data)
+                    new_chunks += 1
+                    stored += len(data)
+
+        manifest = {
+            "name": name,
+            "created": created.isoformat(),
+            "size": size,
+            "sha256": file_hash.hexdigest(),
+            "format": format,
+            "chunks": chunks,
+        }
+        # The manifest goes last, a snapshot is listed once complete.
+        self._write_atomic(
+            self.snapshot_path(name), json.dumps(manifest).encode())
+        return dict(manifest, new_chunks=new_chunks, stored=stored)
+
+    def create(self, name=None):
+        """
+        Take an online backup of the default database and add it.
+        """
+        descriptor, path = tempfile.mkstemp()
+        os.close(descriptor)
+        try:
+            format = snapshot_database(path)
+            return self.add(path, name, format)
+        finally:
+            os.remove(path)
+
+    def restore(self, name, target):
+        """
+        Rebuild snapshot ``name`` into ``target``, checking every chunk and
+        the whole file against their sha256.
+        """
+        manifest = self.manifest(name)
+        file_hash = hashlib.sha256()
+        with open(target, "wb") as restored:
+            for digest in manifest["chunks"]:
+                try:
+                    with open(self.chunk_path(digest), "rb") as chunk_file:
+                        chunk = zlib.decompress(chunk_file.read())
+                except (OSError, zlib.error) as e:
+                    raise ArchiveError(f"Chunk {digest} is unreadable: {e}")
+                if hashlib.sha256(chunk).hexdigest() != digest:
+                    raise ArchiveError(f"Chunk {digest} is corrupted.")
+                file_hash.update(chunk)
+                restored.write(chunk)
+        if file_hash.hexdigest() != manifest["sha256"]:
+            raise ArchiveError(f"Snapshot {name} does not match its hash.")
+        return manifest
+
+    def verify(self, name):
+        """
+        Restore snapshot ``name`` into a temporary file, which checks its
+        hashes, and run SQLite's integrity check on an SQLite snapshot.
+        """
+        descriptor, path = tempfile.mkstemp()
+        os.close(descriptor)
+        result = "ok"
+        try:
+            manifest = self.restore(name, path)
+            if manifest.get("format", "sqlite3") == "sqlite3":
+                database = sqlite3.connect(path)
+                try:
+                    (result,) = database.execute(
+                        "PRAGMA integrity_check").fetchone()
+                finally:
+                    database.close()
+        finally:
+            os.remove(path)
+        if result != "ok":
+            raise ArchiveError(f"Snapshot {name} integrity check: {result}")
+        return manifest
+
+    def prune(self, keep_last, keep_daily):
+        """
+        Keep the ``keep_last`` newest snapshots and the newest snapshot of
+        each of the last ``keep_daily`` days, then delete the chunks no
+        snapshot uses any more. Returns the (snapshots, chunks) removed.
+
+        Not safe to run alongside ``create``, which may rely on a chunk
+        that is about to be deleted.
+        """
+        names = self.snapshots()
+        keep = set(names[-keep_last:] if keep_last else [])
+        # Today is the first of the ``keep_daily`` days.
+        since = (
+            datetime.now(timezone.utc) - timedelta(days=keep_daily - 1)
+        ).strftime("%Y-%m-%d")
+        days = {}
+        manifests = {name: self.manifest(name) for name in names}
+        for name in names:
+            day = manifests[name]["created"][:10]
+            if keep_daily and day >= since:
+                days[day] = name
+        keep.update(days.values())
+
+        removed = [name for name in names if name not in keep]
+        for name in removed:
+            os.remove(self.snapshot_path(name))
+
+        used = set()
+        for name in keep:
+            used.update(manifests[name]["chunks"])
+        removed_chunks = 0
+        for directory, _dirs, files in os.walk(self.chunks_dir):
+            for digest in files:
+                if digest not in used:
+                    os.remove(os.path.join(directory, digest))
+                    removed_chunks += 1
+        return removed, removed_chunks
@@ -0,0 +1,158 @@
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+
+import cloudinary.api
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AssetDeletion
+
+
+logger = logging.getLogger(__name__)
+
+# Public ids accepted by one call of the Admin API batch delete.
+DELETE_CHUNK_SIZE = 100
+
+
+def get_assets(instance):
+    """
+    Return the (public id, resource type) of the Cloudinary assets of
+    ``instance``: its image with the image's derivatives, and its video.
+
+    Files of the Cloudinary storage are named by their public id.
+    """
+    assets = []
+    image = getattr(instance, "image", None)
+    if image:
+        assets.append((image.name, "image"))
+        variants = getattr(instance, "image_variants", None) or {}
+        assets += [(file["name"], "image") for file in variants.get("files", [])]
+    video = getattr(instance, "video", None)
+    if video and getattr(video, "public_id", None):
+        assets.append((video.public_id, video.resource_type))
+    return assets
+
+
+def enqueue_deletions(assets):
+    """
+    Store (public id, resource type) pairs for the delete_assets worker.
+
+    Call it inside the transaction deleting the rows the assets belong to,
+    the assets are then only deleted if the rows are.
+    """
+    return AssetDeletion.objects.bulk_create([
+        AssetDeletion(public_id=public_id, resource_type=resource_type)
+        for public_id, resource_type in assets
+    ])
+
+
+def claim_batch(size):
+    """
+    Claim up to ``size`` due deletions by pushing their next attempt past
+    the lease, so concurrent workers never delete the same asset. A
+    deletion whose worker died is picked up again once the lease ends.
+    """
+    now = timezone.now()
+    lease_end = now + timedelta(seconds=settings.ASSET_DELETION_LEASE)
+    due = AssetDeletion.objects.filter(
+        status=AssetDeletion.PENDING, next_attempt__lte=now
+    ).order_by("next_attempt").values_list("pk", "next_attempt")[:size]
+    claimed = [
+        pk for pk, next_attempt in due
+        if AssetDeletion.objects.filter(
+            pk=pk, next_attempt=next_attempt
+        ).update(next_attempt=lease_end)
+    ]
+    return list(AssetDeletion.objects.filter(pk__in=claimed).order_by("pk"))
+
+
+def retry_later(deletion, error):
+    deletion.attempts += 1
+    deletion.last_error = str(error)
+    if deletion.attempts >= settings.ASSET_DELETION_MAX_ATTEMPTS:
+        deletion.status = AssetDeletion.FAILED
+        logger.error(f">>> Failed to delete asset {deletion}: {error}")
+    else:
+        delay = min(
+            settings.ASSET_DELETION_RETRY_DELAY * 2 ** (deletion.attempts - 1),
+            settings.ASSET_DELETION_MAX_RETRY_DELAY)
+        deletion.next_attempt = timezone.now() + timedelta(seconds=delay)
+        logger.warning(
+            f"Deleting asset {deletion} attempt {deletion.attempts} failed, "
+            f"retrying in {delay}s: {error}")
+    deletion.save(update_fields=[
+        "attempts", "last_error", "status", "next_attempt"])
+
+
+def delete_resources(resource_type, public_ids):
+    """
+    Delete ``public_ids`` with one Admin API call, returns their results
+    ("deleted", "not_found", ...) by public id.
+    """
+    response = cloudinary.api.delete_resources(
+        public_ids, resource_type=resource_type, invalidate=True)
+    return response["deleted"]
+
+
+def get_chunks(deletions):
+    deletions = sorted(deletions, key=attrgetter("resource_type", "pk"))
+    chunks = []
+    for resource_type, group in groupby(
+            deletions, key=attrgetter("resource_type")):
+        group = list(group)
+        chunks += [
+            (resource_type, group[i:i + DELETE_CHUNK_SIZE])
+            for i in range(0, len(group), DELETE_CHUNK_SIZE)
+        ]
+    return chunks
+
+
+def delete_batch(size=500, workers=None):
+    """
+    Delete one batch of due assets, DELETE_CHUNK_SIZE public ids of one
+    resource type per API call, from up to ``workers`` (by default
+    ASSET_DELETION_WORKERS) concurrent calls. Assets already gone count as
+    deleted. Returns the (deleted, failed) counts.
+    """
+    deletions = claim_batch(size)
+    if not deletions:
+        return 0, 0
+
+    chunks = get_chunks(deletions)
+    workers = workers or settings.ASSET_DELETION_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                delete_resources,
+                resource_type,
+                [deletion.public_id for deletion in chunk])
+            for resource_type, chunk in chunks
+        ]
+
+    # The results are written here, the API threads never use the database.
+    deleted = []
+    for (resource_type, chunk), future in zip(chunks, futures):
+        try:
+            results = future.result()
+        except Exception as e:
+            for deletion in chunk:
+                retry_later(deletion, e)
+            continue
+        for deletion in chunk:
+            result = results.get(deletion.public_id)
+            if result in ("deleted", "not_found"):
+                deleted.append(deletion.pk)
+            else:
+                retry_later(deletion, result or "Missing from the response")
+    AssetDeletion.objects.filter(pk__in=deleted).update(
+        status=AssetDeletion.DELETED,
+        attempts=F("attempts") + 1,
+        deleted=timezone.now(),
+    )
+    return len(deleted), len(deletions) - len(deleted)
@@ -0,0 +1,124 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import translation
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views import View
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import (
+    get_request_token,
+    get_site_service_name,
+    service_tokens
+)
+from .cache import aget_validators, aget_versions, set_validators
+from .snapshots import accepts_gzip, aget_snapshot
+from .throttling import ServiceRateThrottle
+
+
+def error_response(detail, status):
+    return JsonResponse({"detail": detail}, status=status)
+
+
+def render_detail(request, viewset, language, lookup):
+    """
+    Serialize the object of ``viewset`` found by ``lookup`` like its
+    ``retrieve`` action. Raises Http404.
+    """
+    with translation.override(language):
+        lookup_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        view = viewset(
+            request=Request(request),
+            format_kwarg=None,
+            action="retrieve",
+            kwargs={lookup_kwarg: lookup},
+        )
+        instance = view.get_object()
+        return JSONRenderer().render(view.get_serializer(instance).data)
+
+
+class AsyncReadView(View):
+    """
+    Async list/retrieve of a snapshot viewset (see main.snapshots), for
+    ASGI workers.
+
+    Authentication, permission, throttling, ETag, Last-Modified and
+    the payloads are the same as the viewset's. Cache hits are answered
+    without a database query, the serialization of a miss runs in a
+    thread.
+    """
+
+    viewset = None
+    detail = False
+    throttle_class = ServiceRateThrottle
+
+    async def get(self, request, lookup=None):
+        service = None
+        token = get_request_token(request)
+        if token:
+            service = await service_tokens.aget(token)
+        if service is None:
+            response = error_response("Invalid service token.", 401)
+            response["WWW-Authenticate"] = "Bearer"
+            return response
+        if service.name != get_site_service_name():
+            return error_response(
+                "You do not have permission to perform this action.", 403)
+
+        throttle = self.throttle_class()
+        if not await throttle.aallow_request(service, request.method):
+            wait = math.ceil(throttle.wait())
+            response = error_response(
+                f"Request was throttled. Expected available in {wait} "
+                f"seconds.", 429)
+            response["Retry-After"] = str(wait)
+            return response
+
+        models = self.viewset.snapshot_models
+        etag, last_modified = await aget_validators(request, models)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            language = translation.get_language()
+            if self.detail:
+                response = await self.retrieve(request, language, lookup)
+            else:
+                response = await self.list(request, language)
+
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
+
+    async def list(self, request, language):
+        content, compressed = await aget_snapshot(self.viewset, language)
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if accepts_gzip.search(accept_encoding):
+            response = HttpResponse(
+                compressed, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(content, content_type="application/json")
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+    async def retrieve(self, request, language, lookup):
+        versions = ".".join(await aget_versions(self.viewset.snapshot_models))
+        # File URLs are absolute, built from the request's host.
+        key = (
+            f"detail.{self.viewset.__name__}.{language}."
+            f"{request.build_absolute_uri('/')}.{lookup}.{versions}"
+        )
+        content = await cache.aget(key)
+        if content is None:
+            try:
+                content = await sync_to_async(render_detail)(
+                    request, self.viewset, language, lookup)
+            except Http404:
+                return error_response("Not found.", 404)
+            await cache.aset(key, content, settings.API_CACHE_TIMEOUT)
+        return HttpResponse(content, content_type="application/json")
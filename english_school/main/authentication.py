@@ -1,9 +1,15 @@
+import hashlib
 import logging
 
+from functools import lru_cache
+from hmac import compare_digest
+from threading import Lock
+
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import BasePermission
 
+from .cache import aget_versions, get_versions
 from .models import Service
 from english_school.settings import env
 
@@ -11,18 +17,85 @@ from english_school.settings import env
 logger = logging.getLogger(__name__)
 
 
+class ServiceTokens:
+    """
+    Process-local map of the service tokens.
+
+    The map is reloaded when the Service cache version changes, which
+    main.signals bumps whenever a service (and so its token) is saved or
+    deleted, so a request with a known version needs no query.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._services = {}
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def _set_services(self, services, version):
+        self._services = {
+            self._digest(service.token): service for service in services
+        }
+        self._version = version
+
+    def _load(self, version):
+        with self._lock:
+            if self._version != version:
+                self._set_services(Service.objects.all(), version)
+
+    def _match(self, token):
+        service = self._services.get(self._digest(token))
+        if service is not None and compare_digest(
+                service.token.encode(), token.encode()):
+            return service
+        return None
+
+    def get(self, token):
+        (version,) = get_versions([Service])
+        if version != self._version:
+            self._load(version)
+        return self._match(token)
+
+    async def aget(self, token):
+        (version,) = await aget_versions([Service])
+        if version != self._version:
+            services = [service async for service in Service.objects.all()]
+            self._set_services(services, version)
+        return self._match(token)
+
+
+service_tokens = ServiceTokens()
+
+
+@lru_cache(maxsize=None)
+def get_site_service_name():
+    return env("SERVICE_SITE_NAME")
+
+
+def get_request_token(request):
+    """
+    Return the token of a "Bearer <token>" Authorization header, or None.
+    """
+    header = request.META.get("HTTP_AUTHORIZATION")
+    if header:
+        try:
+            return header.split(" ")[1]
+        except IndexError:
+            pass
+    return None
+
+
 class ServiceOnlyAuthentication(BaseAuthentication):
     def authenticate(self, request):
-        token = request.META.get("HTTP_AUTHORIZATION")
+        token = get_request_token(request)
         if token:
-            try:
-                token = token.split(" ")[1]
-                service = Service.objects.get(token=token)
-                if token == service.token:
-                    return (service, None)
-            except Service.DoesNotExist:
-                logger.info(f"Service with token '{token}' does not exist.")
-                pass
+            service = service_tokens.get(token)
+            if service is not None:
+                return (service, None)
+            logger.info(f"Service with token '{token}' does not exist.")
         raise AuthenticationFailed("Invalid service token.")
 
     def authenticate_header(self, request):
@@ -33,6 +106,6 @@ class ServiceOnlyAuthorizationSite(BasePermission):
     def has_permission(self, request, view):
         if isinstance(request.user, Service):
             service_name = request.user.name
-            if service_name == env("SERVICE_SITE_NAME"):
+            if service_name == get_site_service_name():
                 return True
         return False
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import tempfile
+import subprocess
+
+from django.db import connection
+
+from .compression import iter_gzip
+
+
+# Pages copied per backup step. Writers are only blocked during a step.
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+CHUNK_SIZE = 256 * 1024
+
+
+def backup_sqlite(target_path):
+    """
+    Copy the default SQLite database into ``target_path`` with the online
+    backup API, a few pages at a time, so writers keep going in between.
+    """
+    connection.ensure_connection()
+    target = sqlite3.connect(target_path)
+    try:
+        connection.connection.backup(
+            target, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP)
+    finally:
+        target.close()
+
+
+def dump_postgresql(target_path):
+    """
+    Dump the default PostgreSQL database into ``target_path`` as SQL with
+    pg_dump, which reads from a single consistent snapshot and does not
+    block writers.
+    """
+    from django.db.backends.postgresql.client import DatabaseClient
+
+    args, env = DatabaseClient.settings_to_cmd_args_env(
+        connection.settings_dict,
+        ["--no-owner", "--no-privileges", "--file", target_path])
+    args[0] = "pg_dump"
+    subprocess.run(args, env={**os.environ, **(env or {})}, check=True)
+
+
+def snapshot_database(target_path):
+    """
+    Write a consistent snapshot of the default database to
+    ``target_path``. Returns the file extension of its format.
+    """
+    if connection.vendor == "postgresql":
+        dump_postgresql(target_path)
+        return "sql"
+    backup_sqlite(target_path)
+    return "sqlite3"
+
+
+def iter_file(source):
+    """
+    Yield the content of the binary file ``source`` chunk by chunk,
+    closing it at the end.
+    """
+    with source:
+        while chunk := source.read(CHUNK_SIZE):
+            yield chunk
+
+
+def stream_backup():
+    """
+    Take a snapshot of the database into a temporary file and return the
+    iterator streaming it gzip-compressed, with the snapshot extension.
+
+    The file is unlinked once opened, its space is freed when the stream
+    is closed or garbage collected, whether or not it was consumed.
+    """
+    descriptor, path = tempfile.mkstemp()
+    os.close(descriptor)
+    try:
+        extension = snapshot_database(path)
+        source = open(path, "rb")
+    finally:
+        os.remove(path)
+    return iter_gzip(iter_file(source)), extension
@@ -0,0 +1,20 @@
+import statistics
+
+
+# Unit -> seconds multiplier.
+UNITS = {"ms": 1e3, "us": 1e6}
+
+
+def format_latencies(times, unit="us"):
+    """
+    Return the p50, p99 and max of ``times`` (seconds) in ``unit``, as the
+    benchmark commands print them.
+    """
+    times = sorted(times)
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    scale = UNITS[unit]
+    return (
+        f"p50 {statistics.median(times) * scale:>8.1f}{unit}  "
+        f"p99 {p99 * scale:>8.1f}{unit}  "
+        f"max {times[-1] * scale:>9.1f}{unit}"
+    )
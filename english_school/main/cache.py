@@ -0,0 +1,165 @@
+import time
+import hashlib
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.crypto import get_random_string
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_page
+
+
+VERSION_KEY_PREFIX = "api-version"
+
+
+def version_key(model):
+    return f"{VERSION_KEY_PREFIX}.{model._meta.label_lower}"
+
+
+def new_version():
+    # The time of the bump (hex seconds) comes first, for Last-Modified.
+    return f"{int(time.time()):x}-{get_random_string(length=8)}"
+
+
+def get_version_time(version):
+    """
+    Return the time ``version`` was made at, None for a version without
+    one.
+    """
+    timestamp, separator, rest = version.partition("-")
+    try:
+        return int(timestamp, 16) if separator else None
+    except ValueError:
+        return None
+
+
+def get_versions(models):
+    """
+    Return the current cache version of every model, in order.
+    """
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A missing version must never fall back to a fixed default,
+            # otherwise responses cached under it would become valid again
+            # after the version key is culled.
+            version = new_version()
+            if not cache.add(key, version, None):
+                # Another request initialised it first.
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(models):
+    """
+    Async get_versions.
+    """
+    keys = [version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            if not await cache.aadd(key, version, None):
+                version = await cache.aget(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    cache.set(version_key(model), new_version(), None)
+
+
+def cache_response(*models, timeout=None):
+    """
+    Like ``cache_page``, but the cache key includes the versions of
+    ``models``, so a cached response lives until one of them changes
+    (see main.signals) or ``timeout`` expires.
+    """
+    if timeout is None:
+        timeout = settings.API_CACHE_TIMEOUT
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            key_prefix = "api." + ".".join(get_versions(models))
+            cached_view = cache_page(timeout, key_prefix=key_prefix)(view_func)
+            return cached_view(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
+
+
+def make_etag(request, versions):
+    parts = [
+        request.get_full_path(),
+        translation.get_language(),
+        request.META.get("HTTP_ACCEPT_ENCODING", ""),
+        *versions,
+    ]
+    return quote_etag(hashlib.md5("|".join(parts).encode()).hexdigest())
+
+
+def get_last_modified(versions):
+    """
+    Return the time of the newest of ``versions``: a change of the data
+    behind them is at most as recent. None if any has no time.
+    """
+    times = [get_version_time(version) for version in versions]
+    if not times or None in times:
+        return None
+    return max(times)
+
+
+def get_validators(request, models):
+    """
+    Return the strong ETag and the Last-Modified time of the data behind
+    ``models``, made of their cache versions. Every change bumps them
+    (see main.signals), deletes and rows without an ``updated`` time
+    included, and no query is needed.
+    """
+    versions = get_versions(models)
+    return make_etag(request, versions), get_last_modified(versions)
+
+
+async def aget_validators(request, models):
+    """
+    Async get_validators.
+    """
+    versions = await aget_versions(models)
+    return make_etag(request, versions), get_last_modified(versions)
+
+
+def set_validators(response, etag, last_modified):
+    response.headers.setdefault("ETag", etag)
+    if last_modified is not None:
+        response.headers.setdefault("Last-Modified", http_date(last_modified))
+
+
+def conditional_response(*models):
+    """
+    Answer If-None-Match or If-Modified-Since with a 304 when the data
+    behind ``models`` is unchanged, and add the ETag and Last-Modified to
+    the response. Place it above ``cache_response`` so a 304 skips the
+    cache too.
+
+    Last-Modified has a one second resolution, two changes within the same
+    second are only told apart by the ETag.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            etag, last_modified = get_validators(request, models)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+        return _wrapped_view
+    return decorator
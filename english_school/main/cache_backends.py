@@ -0,0 +1,492 @@
+import os
+import pickle
+import sqlite3
+import time
+
+from collections import Counter
+from threading import Lock, local
+
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+
+# Counters are shared by every thread of the process, like the LocMemCache
+# storage, and keyed by the cache LOCATION.
+_counters = {}
+_counter_locks = {}
+
+_MISSING = object()
+
+
+def create_backend(config):
+    params = config.copy()
+    backend_cls = import_string(params.pop("BACKEND"))
+    return backend_cls(params.pop("LOCATION", ""), params)
+
+
+class TieredCache(BaseCache):
+    """
+    A bounded per-process LRU (LocMemCache) in front of a shared backend.
+
+    Reads are served from the local tier and promoted into it on a shared
+    hit, writes and deletes go through to both tiers. Local entries live
+    at most LOCAL_TIMEOUT seconds, which bounds how long a write made by
+    another worker can go unnoticed. Keys starting with one of
+    LOCAL_BYPASS_PREFIXES are never kept locally, so changes to them (e.g.
+    the API cache versions) are seen by every worker immediately.
+
+    OPTIONS:
+        SHARED                 cache config of the shared tier
+        LOCAL_MAX_ENTRIES      size of the local tier (default 300)
+        LOCAL_CULL_FREQUENCY   1/n of the LRU tail dropped when full
+        LOCAL_TIMEOUT          seconds an entry stays local (default 10)
+        LOCAL_BYPASS_PREFIXES  keys that always go to the shared tier
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared = create_backend(options["SHARED"])
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 10)
+        self.local = LocMemCache(
+            f"tiered-{location}",
+            {
+                "TIMEOUT": self.local_timeout,
+                "OPTIONS": {
+                    "MAX_ENTRIES": options.get("LOCAL_MAX_ENTRIES", 300),
+                    "CULL_FREQUENCY": options.get("LOCAL_CULL_FREQUENCY", 10),
+                },
+            },
+        )
+        self.local_bypass_prefixes = tuple(
+            options.get("LOCAL_BYPASS_PREFIXES", ()))
+        self._counters = _counters.setdefault(location, Counter())
+        self._counter_lock = _counter_locks.setdefault(location, Lock())
+
+    def _count(self, **counts):
+        with self._counter_lock:
+            self._counters.update(counts)
+
+    def _is_local(self, key):
+        return not key.startswith(self.local_bypass_prefixes)
+
+    def _get_local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def stats(self):
+        """
+        Hit/miss counters of both tiers and the local tier fill level.
+        """
+        with self._counter_lock:
+            stats = dict(self._counters)
+        for name in ("local_hits", "local_misses",
+                     "shared_hits", "shared_misses"):
+            stats.setdefault(name, 0)
+        stats["local_entries"] = len(self.local._cache)
+        stats["local_max_entries"] = self.local._max_entries
+        return stats
+
+    def reset_stats(self):
+        with self._counter_lock:
+            self._counters.clear()
+
+    def _get_local(self, key, version):
+        if not self._is_local(key):
+            return _MISSING
+        value = self.local.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(local_misses=1)
+        else:
+            self._count(local_hits=1)
+        return value
+
+    def get(self, key, default=None, version=None):
+        value = self._get_local(key, version)
+        if value is not _MISSING:
+            return value
+        return self._get_shared(key, default, version)
+
+    def _get_shared(self, key, default, version):
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(shared_misses=1)
+            return default
+
+        self._count(shared_hits=1)
+        if self._is_local(key):
+            self.local.set(key, value, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        local_keys = [key for key in keys if self._is_local(key)]
+        found = self.local.get_many(local_keys, version=version)
+        self._count(
+            local_hits=len(found),
+            local_misses=len(local_keys) - len(found))
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared_found = self.shared.get_many(missing, version=version)
+            self._count(
+                shared_hits=len(shared_found),
+                shared_misses=len(missing) - len(shared_found))
+            self.local.set_many(
+                {
+                    key: value
+                    for key, value in shared_found.items()
+                    if self._is_local(key)
+                },
+                version=version,
+            )
+            found.update(shared_found)
+        return found
+
+    # Under ASGI a local hit is answered on the event loop and only the
+    # shared tier goes to a thread. Those calls are not thread sensitive,
+    # so concurrent requests don't queue on the single sync thread.
+
+    async def aget(self, key, default=None, version=None):
+        value = self._get_local(key, version)
+        if value is not _MISSING:
+            return value
+        return await sync_to_async(self._get_shared, thread_sensitive=False)(
+            key, default, version)
+
+    async def aget_many(self, keys, version=None):
+        local_keys = [key for key in keys if self._is_local(key)]
+        if len(local_keys) == len(keys):
+            found = self.local.get_many(keys, version=version)
+            if len(found) == len(keys):
+                self._count(local_hits=len(found))
+                return found
+        return await sync_to_async(self.get_many, thread_sensitive=False)(
+            keys, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        await sync_to_async(self.set, thread_sensitive=False)(
+            key, value, timeout, version)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.add, thread_sensitive=False)(
+            key, value, timeout, version)
+
+    def has_key(self, key, version=None):
+        if self._is_local(key) and self.local.has_key(key, version=version):
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def _set_local(self, key, value, timeout, version):
+        if self._is_local(key) and (
+                timeout is DEFAULT_TIMEOUT or timeout is None or timeout > 0):
+            self.local.set(
+                key, value, self._get_local_timeout(timeout), version=version)
+        else:
+            self.local.delete(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._set_local(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._set_local(key, value, timeout, version)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            self._set_local(key, value, timeout, version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.touch(
+            key, self._get_local_timeout(timeout), version=version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.incr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        self.local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        # Other workers keep their local tier for up to LOCAL_TIMEOUT.
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class SQLiteCache(BaseCache):
+    """
+    A cache shared by all worker processes, stored in one SQLite file.
+
+    Entries are indexed by expiry and by last access, so culling deletes
+    expired rows and then the least recently used ones through the
+    indexes, without scanning the whole cache. The entry count is kept by
+    triggers. The database runs in WAL mode, so readers never block the
+    writer and every process can safely open its own connection.
+
+    OPTIONS (besides MAX_ENTRIES and CULL_FREQUENCY):
+        ACCESS_RESOLUTION  seconds between last-access updates of an entry
+                           (default 30), keeps most reads write-free
+        BUSY_TIMEOUT       seconds to wait for the write lock (default 5)
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    schema = [
+        "CREATE TABLE IF NOT EXISTS cache ("
+        " key TEXT PRIMARY KEY,"
+        " value BLOB NOT NULL,"
+        " expires REAL,"
+        " accessed REAL NOT NULL"
+        ") WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)"
+        " WHERE expires IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)",
+        "CREATE TABLE IF NOT EXISTS cache_stats (entries INTEGER NOT NULL)",
+        "INSERT INTO cache_stats (entries)"
+        " SELECT COUNT(*) FROM cache"
+        " WHERE NOT EXISTS (SELECT 1 FROM cache_stats)",
+        "CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache"
+        " BEGIN UPDATE cache_stats SET entries = entries + 1; END",
+        "CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache"
+        " BEGIN UPDATE cache_stats SET entries = entries - 1; END",
+    ]
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = os.path.abspath(location)
+        self._access_resolution = options.get("ACCESS_RESOLUTION", 30)
+        self._busy_timeout = options.get("BUSY_TIMEOUT", 5)
+        self._local = local()
+
+    @property
+    def _connection(self):
+        # One connection per thread, reopened after a fork (gunicorn).
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                for statement in self.schema:
+                    connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self):
+        """
+        Context manager for a write transaction that takes the lock up
+        front, so concurrent writers wait instead of failing on upgrade.
+        """
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        return connection
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _set_rows(self, connection, rows, timeout, only_expired=False):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        statement = (
+            "INSERT INTO cache (key, value, expires, accessed)"
+            " VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " value = excluded.value,"
+            " expires = excluded.expires,"
+            " accessed = excluded.accessed"
+        )
+        if only_expired:
+            statement += " WHERE cache.expires IS NOT NULL AND cache.expires <= ?"
+            rows = [
+                (key, self._dumps(value), expires, now, now)
+                for key, value in rows
+            ]
+        else:
+            rows = [
+                (key, self._dumps(value), expires, now)
+                for key, value in rows
+            ]
+        cursor = connection.executemany(statement, rows)
+        self._cull(connection, now)
+        return cursor.rowcount
+
+    def _cull(self, connection, now):
+        (entries,) = connection.execute(
+            "SELECT entries FROM cache_stats").fetchone()
+        if entries <= self._max_entries:
+            return
+        connection.execute(
+            "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?",
+            (now,),
+        )
+        (entries,) = connection.execute(
+            "SELECT entries FROM cache_stats").fetchone()
+        if entries <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute("DELETE FROM cache")
+            return
+        # Make room for a batch of writes, not only for this one.
+        count = entries - self._max_entries + (
+            self._max_entries // self._cull_frequency)
+        connection.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+            (count,),
+        )
+
+    def _get_rows(self, keys):
+        now = time.time()
+        connection = self._connection
+        found = {}
+        stale = []
+        expired = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = connection.execute(
+                "SELECT key, value, expires, accessed FROM cache"
+                f" WHERE key IN ({placeholders})",
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    expired.append((key,))
+                    continue
+                found[key] = value
+                if accessed < now - self._access_resolution:
+                    stale.append((now, key))
+        if stale or expired:
+            with self._write() as connection:
+                connection.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?", stale)
+                connection.executemany(
+                    "DELETE FROM cache WHERE key = ?"
+                    " AND expires IS NOT NULL AND expires <= ?",
+                    [(key, now) for (key,) in expired],
+                )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._get_rows([key]).get(key)
+        if value is None:
+            return default
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        key_map = {
+            self.make_and_validate_key(key, version=version): key
+            for key in keys
+        }
+        return {
+            key_map[key]: pickle.loads(value)
+            for key, value in self._get_rows(list(key_map)).items()
+        }
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection.execute(
+            "SELECT 1 FROM cache WHERE key = ?"
+            " AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as connection:
+            self._set_rows(connection, [(key, value)], timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as connection:
+            return self._set_rows(
+                connection, [(key, value)], timeout, only_expired=True) > 0
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = [
+            (self.make_and_validate_key(key, version=version), value)
+            for key, value in data.items()
+        ]
+        with self._write() as connection:
+            self._set_rows(connection, rows, timeout)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as connection:
+            cursor = connection.execute(
+                "UPDATE cache SET expires = ?, accessed = ? WHERE key = ?"
+                " AND (expires IS NULL OR expires > ?)",
+                (self.get_backend_timeout(timeout), now, key, now),
+            )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                "SELECT value FROM cache WHERE key = ?"
+                " AND (expires IS NULL OR expires > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            connection.execute(
+                "UPDATE cache SET value = ?, accessed = ? WHERE key = ?",
+                (self._dumps(new_value), now, key),
+            )
+        return new_value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as connection:
+            cursor = connection.execute(
+                "DELETE FROM cache WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [
+            (self.make_and_validate_key(key, version=version),)
+            for key in keys
+        ]
+        with self._write() as connection:
+            connection.executemany("DELETE FROM cache WHERE key = ?", keys)
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute("DELETE FROM cache")
+
+    def close(self, **kwargs):
+        # Connections are kept for the life of the thread, like the
+        # file handles of FileBasedCache they are cheap to keep open.
+        pass
@@ -0,0 +1,19 @@
+import zlib
+
+
+# Compression level of the streamed gzip responses.
+GZIP_LEVEL = 6
+
+
+def iter_gzip(chunks):
+    """
+    Yield the gzip stream of the byte strings ``chunks`` as they come, so
+    a response is compressed without holding it in memory.
+    """
+    compressor = zlib.compressobj(
+        GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
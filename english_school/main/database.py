@@ -0,0 +1,16 @@
+from django.conf import settings
+
+
+def set_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    connection_created receiver setting SQLITE_PRAGMAS on new SQLite
+    connections.
+    """
+    if connection.vendor == "sqlite" and settings.SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            set_pragmas(cursor, settings.SQLITE_PRAGMAS)
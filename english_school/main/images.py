@@ -0,0 +1,173 @@
+import os
+import logging
+
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from PIL import Image, ImageOps
+
+from .assets import enqueue_deletions
+
+
+logger = logging.getLogger(__name__)
+
+# Pillow format -> (file extension, content type) of the derivatives.
+# Other formats (GIF, BMP, ...) get PNG derivatives besides the WebP ones.
+SAVE_FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+}
+
+
+def get_save_options(image_format):
+    quality = settings.IMAGE_DERIVATIVE_QUALITY
+    return {
+        "JPEG": {"quality": quality, "optimize": True, "progressive": True},
+        "PNG": {"optimize": True},
+        "WEBP": {"quality": quality, "method": 4},
+    }[image_format]
+
+
+def prepare(image, image_format):
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    if image_format != "JPEG" and image.mode not in ("RGB", "RGBA", "L"):
+        return image.convert("RGBA")
+    return image
+
+
+def render(image, image_format):
+    buffer = BytesIO()
+    prepare(image, image_format).save(
+        buffer, image_format, **get_save_options(image_format))
+    return buffer.getvalue()
+
+
+def make_derivatives(field_file):
+    """
+    Store resized copies of the image in ``field_file`` next to it, in its
+    own format and in WebP, for every IMAGE_DERIVATIVE_WIDTHS narrower
+    than the original (WebP also at the original width).
+
+    Returns the variants to keep on the row::
+
+        {"source": <image name>, "width": ..., "height": ...,
+         "type": <content type>,
+         "files": [{"name": ..., "width": ..., "type": ...}, ...]}
+    """
+    field_file.open("rb")
+    try:
+        image = Image.open(field_file)
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    finally:
+        field_file.close()
+
+    width, height = image.size
+    formats = ["WEBP"]
+    if image_format != "WEBP":
+        formats.append(image_format if image_format in SAVE_FORMATS else "PNG")
+
+    root = os.path.splitext(field_file.name)[0]
+    storage = field_file.storage
+    files = []
+    widths = [w for w in settings.IMAGE_DERIVATIVE_WIDTHS if w < width]
+    # Largest first, each width is resized from the previous one.
+    resized = image
+    for target_width in sorted(widths + [width], reverse=True):
+        if target_width != width:
+            resized = resized.resize(
+                (target_width, max(1, round(height * target_width / width))),
+                Image.LANCZOS,
+                reducing_gap=3.0,
+            )
+        for save_format in formats:
+            if target_width == width and save_format == image_format:
+                continue  # the original itself
+            extension, content_type = SAVE_FORMATS[save_format]
+            name = storage.save(
+                f"{root}_{target_width}w.{extension}",
+                ContentFile(render(resized, save_format)))
+            files.append({
+                "name": name,
+                "width": target_width,
+                "type": content_type,
+            })
+    return {
+        "source": field_file.name,
+        "width": width,
+        "height": height,
+        "type": Image.MIME.get(image_format, ""),
+        "files": files,
+    }
+
+
+def get_replaced_files(old, new):
+    """
+    Return the names of the files of the ``old`` variants, the original
+    included, that the ``new`` variants no longer use.
+    """
+    names = {file["name"] for file in old.get("files", [])}
+    if old.get("source"):
+        names.add(old["source"])
+    names -= {file["name"] for file in new.get("files", [])}
+    names.discard(new.get("source"))
+    return sorted(names)
+
+
+def update_derivatives(instance, force=False):
+    """
+    Rebuild the derivatives of ``instance.image`` when it is new or was
+    replaced (or always with ``force``), and queue the replaced image and
+    derivatives for "manage.py delete_assets". Returns True if the
+    variants changed.
+    """
+    old = instance.image_variants or {}
+    if not force and old.get("source", "") == (instance.image.name or ""):
+        return False
+    variants = {}
+    if instance.image:
+        try:
+            variants = make_derivatives(instance.image)
+        except (OSError, Image.DecompressionBombError) as e:
+            # Not an image Pillow can read, serve the original only.
+            logger.error(
+                f">>> Failed to resize {instance.image.name}: {e}")
+            variants = {"source": instance.image.name, "files": []}
+    instance.image_variants = variants
+    type(instance)._default_manager.filter(pk=instance.pk).update(
+        image_variants=variants)
+    # Queued in the saving transaction, like the assets of deleted rows.
+    enqueue_deletions([
+        (name, "image") for name in get_replaced_files(old, variants)])
+    return True
+
+
+def get_image_sources(variants, build_url):
+    """
+    Return the ``<picture>`` sources of ``variants``, WebP first, each with
+    a ``srcset`` of its widths. ``build_url`` turns a file name into a URL.
+    """
+    if not variants or not variants.get("files"):
+        return None
+    srcsets = {}
+    for file in sorted(variants["files"], key=lambda file: file["width"]):
+        srcsets.setdefault(file["type"], []).append(
+            f"{build_url(file['name'])} {file['width']}w")
+    if variants["type"] in srcsets:
+        # The original is the widest candidate of its own format.
+        srcsets[variants["type"]].append(
+            f"{build_url(variants['source'])} {variants['width']}w")
+    return {
+        "width": variants["width"],
+        "height": variants["height"],
+        "sources": [
+            {"type": content_type, "srcset": ", ".join(srcset)}
+            for content_type, srcset in sorted(
+                srcsets.items(), key=lambda item: item[0] != "image/webp")
+        ],
+    }
@@ -0,0 +1,120 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.archive import ArchiveError, BackupArchive
+
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Deduplicated, incremental backups of the database: create a "
+        "snapshot, list, restore or verify them and apply the retention "
+        "policy. Run \"create --prune\" from the scheduler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archive", default=settings.BACKUP_ARCHIVE_DIR,
+                            help="Archive directory.")
+        subparsers = parser.add_subparsers(dest="action", required=True)
+
+        create = subparsers.add_parser("create", help="Take a snapshot.")
+        create.add_argument("--prune", action="store_true",
+                            help="Apply the retention policy afterwards.")
+        self.add_retention_arguments(create)
+
+        subparsers.add_parser("list", help="List the snapshots.")
+
+        restore = subparsers.add_parser(
+            "restore", help="Restore a snapshot into a file.")
+        restore.add_argument("snapshot")
+        restore.add_argument("target")
+
+        verify = subparsers.add_parser(
+            "verify", help="Restore and integrity-check snapshots.")
+        verify.add_argument("snapshot", nargs="*",
+                            help="Snapshots to check, default all.")
+
+        prune = subparsers.add_parser(
+            "prune", help="Apply the retention policy.")
+        self.add_retention_arguments(prune)
+
+    def add_retention_arguments(self, parser):
+        parser.add_argument("--keep-last", type=int,
+                            default=settings.BACKUP_KEEP_LAST)
+        parser.add_argument("--keep-daily", type=int,
+                            default=settings.BACKUP_KEEP_DAILY)
+
+    def handle(self, *args, **options):
+        archive = BackupArchive(options["archive"])
+        try:
+            getattr(self, f"handle_{options['action']}")(archive, options)
+        except ArchiveError as e:
+            raise CommandError(e)
+
+    def handle_create(self, archive, options):
+        started = time.perf_counter()
+        manifest = archive.create()
+        elapsed = time.perf_counter() - started
+        size = manifest["size"]
+        chunks = len(manifest["chunks"])
+        self.stdout.write(
+            f"Snapshot {manifest['name']}: {size / MB:.1f} MB in "
+            f"{elapsed:.2f}s ({size / MB / elapsed:.1f} MB/s), "
+            f"{manifest['new_chunks']}/{chunks} new chunks "
+            f"({1 - manifest['new_chunks'] / max(chunks, 1):.0%} "
+            f"deduplicated), {manifest['stored'] / MB:.2f} MB stored"
+        )
+        self.report_archive(archive)
+        if options["prune"]:
+            self.handle_prune(archive, options)
+
+    def report_archive(self, archive):
+        size, stored = archive.stats()
+        self.stdout.write(
+            f"Archive: {len(archive.snapshots())} snapshots, "
+            f"{size / MB:.1f} MB in {stored / MB:.2f} MB on disk, "
+            f"dedup ratio {size / max(stored, 1):.1f}x"
+        )
+
+    def handle_list(self, archive, options):
+        for name in archive.snapshots():
+            manifest = archive.manifest(name)
+            self.stdout.write(
+                f"{name}  {manifest.get('format', 'sqlite3'):<7}  "
+                f"{manifest['size'] / MB:>8.1f} MB  "
+                f"{len(manifest['chunks'])} chunks")
+        self.report_archive(archive)
+
+    def handle_restore(self, archive, options):
+        started = time.perf_counter()
+        manifest = archive.restore(options["snapshot"], options["target"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {manifest['name']} to {options['target']}: "
+            f"{manifest['size'] / MB:.1f} MB in {elapsed:.2f}s "
+            f"({manifest['size'] / MB / elapsed:.1f} MB/s)"))
+
+    def handle_verify(self, archive, options):
+        names = options["snapshot"] or archive.snapshots()
+        failed = []
+        for name in names:
+            try:
+                archive.verify(name)
+            except ArchiveError as e:
+                failed.append(name)
+                self.stderr.write(str(e))
+            else:
+                self.stdout.write(f"{name}: ok")
+        if failed:
+            raise CommandError(
+                f"{len(failed)} of {len(names)} snapshots failed.")
+
+    def handle_prune(self, archive, options):
+        removed, removed_chunks = archive.prune(
+            options["keep_last"], options["keep_daily"])
+        self.stdout.write(
+            f"Pruned {len(removed)} snapshots and {removed_chunks} chunks")
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.authentication import get_site_service_name
+from main.benchmarks import format_latencies
+from main.models import Service
+
+
+SERVERS = {
+    "wsgi": ["english_school.wsgi:application"],
+    "asgi": [
+        "english_school.asgi:application",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+    ],
+}
+
+
+async def fetch(host, port, request):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def run_load(host, port, request, requests, concurrency):
+    """
+    Send ``requests`` requests from ``concurrency`` concurrent clients and
+    return the (elapsed seconds, latencies, errors).
+    """
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                status = await fetch(host, port, request)
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput and tail latency of a read endpoint under "
+        "the WSGI (gunicorn) and ASGI (uvicorn worker) deployments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/uk/api/courses/")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", default="1,10,50,100",
+                            help="Comma separated client counts.")
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--servers", default="wsgi,asgi")
+
+    def handle(self, *args, **options):
+        try:
+            token = Service.objects.get(name=get_site_service_name()).token
+        except Service.DoesNotExist:
+            raise CommandError(
+                "Create the Service named by SERVICE_SITE_NAME first.")
+        host, port = "127.0.0.1", options["port"]
+        request = (
+            f"GET {options['path']} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            f"Authorization: Bearer {token}\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode()
+        levels = [int(n) for n in options["concurrency"].split(",")]
+
+        for name in options["servers"].split(","):
+            if name not in SERVERS:
+                raise CommandError(f"Unknown server {name!r}.")
+            server = self.start_server(name, host, port, options["workers"])
+            try:
+                # Warm the caches and the workers.
+                asyncio.run(run_load(host, port, request, 100, 10))
+                for concurrency in levels:
+                    self.report(name, concurrency, asyncio.run(run_load(
+                        host, port, request, options["requests"],
+                        concurrency)))
+            finally:
+                server.terminate()
+                server.wait()
+
+    def start_server(self, name, host, port, workers):
+        env = {
+            **os.environ,
+            # The benchmark measures the servers, not the throttle.
+            "API_THROTTLE_READ": "1000000/s",
+            "API_ASYNC_VIEWS": "on" if name == "asgi" else "off",
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", *SERVERS[name],
+             "--bind", f"{host}:{port}", "--workers", str(workers),
+             "--log-level", "warning"],
+            env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"The {name} server exited.")
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"The {name} server did not start.")
+
+    def report(self, name, concurrency, result):
+        elapsed, latencies, errors = result
+        if not latencies:
+            self.stdout.write(f"{name} c={concurrency}: all requests failed")
+            return
+        self.stdout.write(
+            f"{name} c={concurrency:<4} "
+            f"{len(latencies) / elapsed:>8.0f} req/s  "
+            f"{format_latencies(latencies, 'ms')}  "
+            f"errors {errors}"
+        )
@@ -0,0 +1,105 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from multiprocessing import Pool
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import format_latencies
+from main.cache_backends import SQLiteCache
+
+
+BACKENDS = {
+    "file": lambda directory, options: FileBasedCache(
+        os.path.join(directory, "file"), options),
+    "sqlite": lambda directory, options: SQLiteCache(
+        os.path.join(directory, "sqlite", "cache.sqlite3"), options),
+}
+
+
+def run_worker(backend, directory, options, worker, writes, reads, size):
+    cache = BACKENDS[backend](directory, options)
+    payload = os.urandom(size)
+    rng = random.Random(worker)
+
+    set_times = []
+    for i in range(writes):
+        started = time.perf_counter()
+        cache.set(f"w{worker}-{i}", payload)
+        set_times.append(time.perf_counter() - started)
+
+    get_times = []
+    hits = 0
+    for _ in range(reads):
+        key = f"w{worker}-{rng.randrange(max(writes - 100, 0), writes)}"
+        started = time.perf_counter()
+        hits += cache.get(key) is not None
+        get_times.append(time.perf_counter() - started)
+
+    return set_times, get_times, hits
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the file cache with the SQLite cache under the production "
+        "MAX_ENTRIES/CULL_FREQUENCY: set/get throughput and tail latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writes", type=int, default=3000)
+        parser.add_argument("--reads", type=int, default=3000)
+        parser.add_argument("--size", type=int, default=4096,
+                            help="Payload size in bytes.")
+        parser.add_argument("--max-entries", type=int, default=800)
+        parser.add_argument("--cull-frequency", type=int, default=3)
+        parser.add_argument("--processes", type=int, default=1,
+                            help="Worker processes sharing one cache.")
+        parser.add_argument("--backend", choices=BACKENDS, action="append",
+                            help="Backend to run, default all.")
+
+    def handle(self, *args, **options):
+        cache_options = {
+            "TIMEOUT": 300,
+            "OPTIONS": {
+                "MAX_ENTRIES": options["max_entries"],
+                "CULL_FREQUENCY": options["cull_frequency"],
+            },
+        }
+        for backend in options["backend"] or BACKENDS:
+            directory = tempfile.mkdtemp(prefix="cache-benchmark-")
+            try:
+                # Create the cache storage before the workers race for it.
+                BACKENDS[backend](directory, cache_options).get("warmup")
+                arguments = [
+                    (backend, directory, cache_options, worker,
+                     options["writes"], options["reads"], options["size"])
+                    for worker in range(options["processes"])
+                ]
+                started = time.perf_counter()
+                with Pool(options["processes"]) as pool:
+                    results = pool.starmap(run_worker, arguments)
+                elapsed = time.perf_counter() - started
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+            set_times = [t for result in results for t in result[0]]
+            get_times = [t for result in results for t in result[1]]
+            hits = sum(result[2] for result in results)
+            self.stdout.write(
+                f"{backend}: {options['processes']} process(es), "
+                f"{elapsed:.2f}s total, get hit ratio "
+                f"{hits / max(len(get_times), 1):.0%}")
+            self.report("set", set_times)
+            self.report("get", get_times)
+
+    def report(self, name, times):
+        if not times:
+            return
+        self.stdout.write(
+            f"  {name}: {len(times) / sum(times):>9.0f} ops/s  "
+            f"{format_latencies(times)}"
+        )
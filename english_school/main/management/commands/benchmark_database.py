@@ -0,0 +1,130 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import format_latencies
+from main.database import set_pragmas
+
+
+# (persistent connection, pragmas) per profile.
+PROFILES = {
+    "default": (False, {}),
+    "tuned": (True, None),
+}
+
+ROWS = 10000
+
+
+def create_database(path):
+    database = sqlite3.connect(path)
+    with database:
+        database.execute(
+            "CREATE TABLE contact (id INTEGER PRIMARY KEY, name TEXT, "
+            "email TEXT, description TEXT, created REAL)")
+        database.execute("CREATE INDEX contact_created ON contact (created)")
+        database.executemany(
+            "INSERT INTO contact (name, email, description, created) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                (f"Client {i}", f"client{i}@example.com", "x" * 200, i)
+                for i in range(ROWS)
+            ))
+    database.close()
+
+
+def run_worker(path, persistent, pragmas, worker, requests, write_ratio):
+    rng = random.Random(worker)
+
+    def connect():
+        database = sqlite3.connect(path, isolation_level=None)
+        set_pragmas(database, pragmas)
+        return database
+
+    database = connect() if persistent else None
+    read_times, write_times, errors = [], [], 0
+    for _ in range(requests):
+        write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if not persistent:
+                database = connect()
+            if write:
+                database.execute(
+                    "INSERT INTO contact (name, email, description, created) "
+                    "VALUES (?, ?, ?, ?)",
+                    ("New", "new@example.com", "x" * 200, time.time()))
+            else:
+                start = rng.randrange(ROWS)
+                database.execute(
+                    "SELECT * FROM contact WHERE id BETWEEN ? AND ?",
+                    (start, start + 20)).fetchall()
+            if not persistent:
+                database.close()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        (write_times if write else read_times).append(
+            time.perf_counter() - started)
+    return read_times, write_times, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare SQLite read/write throughput under concurrent workers with "
+        "the default connection setup (a connection per request, rollback "
+        "journal) and the tuned one (persistent connection, SQLITE_PRAGMAS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--requests", type=int, default=2000,
+                            help="Requests per process.")
+        parser.add_argument("--write-ratio", type=float, default=0.1)
+        parser.add_argument("--profile", choices=PROFILES, action="append",
+                            help="Profile to run, default all.")
+
+    def handle(self, *args, **options):
+        for profile in options["profile"] or PROFILES:
+            persistent, pragmas = PROFILES[profile]
+            if pragmas is None:
+                pragmas = settings.SQLITE_PRAGMAS
+            directory = tempfile.mkdtemp(prefix="database-benchmark-")
+            path = os.path.join(directory, "db.sqlite3")
+            try:
+                create_database(path)
+                arguments = [
+                    (path, persistent, pragmas, worker,
+                     options["requests"], options["write_ratio"])
+                    for worker in range(options["processes"])
+                ]
+                started = time.perf_counter()
+                with Pool(options["processes"]) as pool:
+                    results = pool.starmap(run_worker, arguments)
+                elapsed = time.perf_counter() - started
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+            read_times = [t for result in results for t in result[0]]
+            write_times = [t for result in results for t in result[1]]
+            errors = sum(result[2] for result in results)
+            self.stdout.write(
+                f"{profile}: {options['processes']} process(es), "
+                f"{elapsed:.2f}s, {errors} 'database is locked' errors")
+            self.report("read", read_times, elapsed)
+            self.report("write", write_times, elapsed)
+
+    def report(self, name, times, elapsed):
+        if not times:
+            return
+        self.stdout.write(
+            f"  {name}: {len(times) / elapsed:>8.0f} ops/s  "
+            f"{format_latencies(times)}"
+        )
@@ -0,0 +1,48 @@
+import time
+
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import format_latencies
+from main.models import Service
+from main.throttling import ServiceRateThrottle
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per request overhead of ServiceRateThrottle on the "
+        "configured cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20000)
+        parser.add_argument("--services", type=int, default=10)
+        parser.add_argument("--cache", default="default",
+                            help="Cache alias holding the buckets.")
+
+    def handle(self, *args, **options):
+        throttle = ServiceRateThrottle()
+        throttle.cache_alias = options["cache"]
+        # Unsaved services with a budget that is never exhausted, so every
+        # call takes the full get + set path.
+        services = [
+            Service(pk=-1 - i, name=f"benchmark-{i}",
+                    read_rate="1000000/s", write_rate="1000000/s")
+            for i in range(options["services"])
+        ]
+        times = {"read": [], "write": []}
+        for i in range(options["requests"]):
+            method = "POST" if i % 10 == 0 else "GET"
+            request = SimpleNamespace(
+                user=services[i % len(services)], method=method)
+            started = time.perf_counter()
+            throttle.allow_request(request, None)
+            times[throttle.get_scope(method)].append(
+                time.perf_counter() - started)
+
+        for scope, scope_times in times.items():
+            if scope_times:
+                self.stdout.write(
+                    f"{scope}: {len(scope_times)} requests  "
+                    f"{format_latencies(scope_times)}")
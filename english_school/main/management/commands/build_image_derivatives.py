@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.cache import bump_version
+from main.images import update_derivatives
+from main.signals import IMAGE_MODELS
+from main.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the responsive image derivatives of the rows that have none "
+        "yet, or of every row with --force."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true",
+                            help="Rebuild the existing derivatives too.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        built = 0
+        changed = set()
+        for model in IMAGE_MODELS:
+            for instance in model._default_manager.exclude(
+                    image="").exclude(image=None).iterator():
+                with transaction.atomic():
+                    if not update_derivatives(instance, options["force"]):
+                        continue
+                built += 1
+                changed.add(model)
+                files = instance.image_variants.get("files", [])
+                self.stdout.write(
+                    f"{model._meta.label} {instance.pk}: "
+                    f"{instance.image.name}, {len(files)} derivatives")
+        # The variants are written with update(), no signal refreshes the
+        # cached responses.
+        for model in changed:
+            bump_version(model)
+        if changed:
+            refresh_snapshots(changed)
+        self.stdout.write(self.style.SUCCESS(
+            f"Built the derivatives of {built} images in "
+            f"{time.perf_counter() - started:.2f}s"))
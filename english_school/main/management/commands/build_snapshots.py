@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.snapshots import build_snapshot, get_languages, get_snapshot_viewsets
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pre-rendered JSON snapshots of every list endpoint."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        for prefix, viewset in get_snapshot_viewsets():
+            for language in get_languages():
+                built = time.perf_counter()
+                content, compressed = build_snapshot(viewset, language)
+                self.stdout.write(
+                    f"{prefix} [{language}]: {len(content)} bytes, "
+                    f"{len(compressed)} gzipped, "
+                    f"{(time.perf_counter() - built) * 1000:.1f}ms"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshots rebuilt in {time.perf_counter() - started:.2f}s"))
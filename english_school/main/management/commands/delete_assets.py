@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.assets import delete_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the Cloudinary assets of deleted rows in batches, retrying "
+        "failures with backoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Deletions claimed at once.")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Concurrent API calls, "
+                                 "ASSET_DELETION_WORKERS by default.")
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep polling the queue instead of "
+                                 "exiting once it is drained.")
+        parser.add_argument("--interval", type=float, default=30,
+                            help="Seconds to wait when nothing is due.")
+
+    def handle(self, *args, **options):
+        total_deleted = total_failed = 0
+        try:
+            while True:
+                deleted, failed = delete_batch(
+                    options["batch_size"], options["workers"])
+                total_deleted += deleted
+                total_failed += failed
+                if deleted or failed:
+                    self.stdout.write(f"Deleted {deleted}, failed {failed}")
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+                # The connection may have gone stale meanwhile.
+                close_old_connections()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Asset queue drained: {total_deleted} deleted, "
+            f"{total_failed} failed"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.cache import bump_version
+from main.models import SearchEntry
+from main.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of courses and teachers."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_index()
+        bump_version(SearchEntry)
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} search entries indexed in "
+            f"{time.perf_counter() - started:.2f}s"))
@@ -0,0 +1,60 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.models import Newsletter
+from main.newsletter import send_newsletter
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the queued newsletters, resuming any interrupted one with "
+        "its remaining recipients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int,
+                            help="Messages per SMTP connection, default "
+                                 "NEWSLETTER_BATCH_SIZE.")
+        parser.add_argument("--rate", type=float,
+                            help="Messages per second, 0 for unthrottled, "
+                                 "default NEWSLETTER_RATE.")
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep polling for newsletters.")
+        parser.add_argument("--interval", type=float, default=30,
+                            help="Seconds to wait between polls or after "
+                                 "an error.")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                self.send_queued(options)
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+                # The connection may have gone stale meanwhile.
+                close_old_connections()
+        except KeyboardInterrupt:
+            pass
+
+    def send_queued(self, options):
+        newsletters = Newsletter.objects.exclude(
+            status=Newsletter.DONE).order_by("pk")
+        for newsletter in newsletters:
+            started = time.perf_counter()
+            try:
+                sent, failed = send_newsletter(
+                    newsletter, options["batch_size"], options["rate"])
+            except Exception as e:
+                # The pending deliveries are retried on the next poll.
+                logger.error(
+                    f">>> Failed to send newsletter {newsletter.pk}: {e}")
+                continue
+            self.stdout.write(
+                f"{newsletter}: {sent} sent, {failed} failed in "
+                f"{time.perf_counter() - started:.1f}s")
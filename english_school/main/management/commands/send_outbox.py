@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.outbox import send_batch
+
+
+class Command(BaseCommand):
+    help = "Send the queued emails, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50,
+                            help="Emails sent over one SMTP connection.")
+        parser.add_argument("--loop", action="store_true",
+                            help="Keep polling the outbox instead of "
+                                 "exiting once it is drained.")
+        parser.add_argument("--interval", type=float, default=5,
+                            help="Seconds to wait when nothing is due.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = send_batch(options["batch_size"])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent}, failed {failed}")
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+                # The connection may have gone stale meanwhile.
+                close_old_connections()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox drained: {total_sent} sent, {total_failed} failed"))
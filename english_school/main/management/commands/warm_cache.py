@@ -0,0 +1,70 @@
+import time
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import Service
+from main.warmup import CacheWarmer, get_default_host, get_warmup_targets
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the API caches for every read endpoint and language, as the "
+        "site service would request them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default=get_default_host(),
+                            help="Host the site requests the API on, by "
+                                 "default the first of ALLOWED_HOSTS.")
+        parser.add_argument("--secure", action="store_true",
+                            help="The API is requested over https.")
+        parser.add_argument("--accept", default="*/*",
+                            help="Accept header the site sends.")
+        parser.add_argument("--language", action="append",
+                            dest="languages",
+                            help="Warm only this language (repeatable).")
+        parser.add_argument("--workers", type=int, default=4)
+
+    def handle(self, *args, **options):
+        languages = options["languages"] or [
+            code for code, name in settings.LANGUAGES]
+        try:
+            warmer = CacheWarmer(
+                options["host"], options["secure"], options["accept"])
+        except Service.DoesNotExist:
+            raise CommandError(
+                "Create the Service named by SERVICE_SITE_NAME first.")
+
+        started = time.perf_counter()
+        results = warmer.run(
+            get_warmup_targets(languages), options["workers"])
+        elapsed = time.perf_counter() - started
+
+        endpoints = defaultdict(list)
+        for result in results:
+            target = result.target
+            endpoints[target.prefix, target.language, target.action].append(
+                result)
+        errors = 0
+        for (prefix, language, action), endpoint_results in sorted(
+                endpoints.items()):
+            failed = [r for r in endpoint_results if r.status != 200]
+            errors += len(failed)
+            times = [r.elapsed for r in endpoint_results]
+            line = (
+                f"{prefix} {action} [{language}]: "
+                f"{len(endpoint_results)} requests, "
+                f"{sum(times) * 1000:.1f}ms total, "
+                f"{max(times) * 1000:.1f}ms max"
+            )
+            if failed:
+                line += f", {len(failed)} failed ({failed[0].status})"
+            self.stdout.write(line)
+
+        style = self.style.ERROR if errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Warmed {len(results) - errors} of {len(results)} requests "
+            f"in {elapsed:.2f}s"))
@@ -0,0 +1,108 @@
+from django.db import models
+from django.db.models import Prefetch
+from django.utils.translation import get_language
+
+from parler.cache import MISSING
+from parler.managers import TranslatableManager, TranslatableQuerySet
+from parler.utils import get_language_settings
+
+
+def get_related_objects(instances, lookup):
+    """
+    Return the objects reached from ``instances`` through ``lookup``,
+    which must be prefetched.
+    """
+    for name in filter(None, lookup.split("__")):
+        related = []
+        for instance in instances:
+            value = getattr(instance, name)
+            if isinstance(value, models.Manager):
+                related.extend(value.all())
+            elif value is not None:
+                related.append(value)
+        instances = related
+    return instances
+
+
+def load_translations(instance, languages):
+    """
+    Put the prefetched translations of ``instance`` in its own translation
+    cache, and mark the ``languages`` it has none in as missing. Parler
+    then reads them from there, without a query or a shared cache access.
+    """
+    meta = instance._parler_meta.root
+    local_cache = instance._translations_cache[meta.model]
+    loaded = instance._read_prefetched_translations(meta=meta)
+    for language in languages:
+        if language not in loaded:
+            local_cache.setdefault(language, MISSING)
+
+
+class TranslatedQuerySet(TranslatableQuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (lookups, languages) of prefetch_translations.
+        self._translation_prefetch = None
+
+    def _clone(self):
+        c = super()._clone()
+        c._translation_prefetch = self._translation_prefetch
+        return c
+
+    def _prefetch_related_objects(self):
+        super()._prefetch_related_objects()
+        if (
+            self._translation_prefetch is None
+            or not self._result_cache
+            or not isinstance(self._result_cache[0], models.Model)
+        ):
+            return
+        lookups, languages = self._translation_prefetch
+        for lookup in lookups:
+            for instance in get_related_objects(self._result_cache, lookup):
+                load_translations(instance, languages)
+
+    def translation_languages(self):
+        """
+        Return the active language followed by its parler fallbacks.
+        """
+        language_code = self._language or get_language()
+        fallbacks = get_language_settings(language_code)["fallbacks"]
+        languages = [language_code]
+        languages.extend(
+            code for code in fallbacks if code not in languages
+        )
+        return languages
+
+    def prefetch_translations(self, *lookups):
+        """
+        Prefetch the translations of the queryset model and of the
+        translatable models reachable through ``lookups`` (e.g.
+        ``"category"`` or ``"teacher_educations"``).
+
+        Only the active language and its fallbacks are loaded, so each
+        translated model costs exactly one query for the whole result set.
+        They go straight into the objects' translation caches, parler's
+        shared cache is neither read nor written.
+        """
+        languages = self.translation_languages()
+        prefetches = []
+        for lookup in ("",) + lookups:
+            model = self.model
+            for name in filter(None, lookup.split("__")):
+                model = model._meta.get_field(name).related_model
+            parler_meta = model._parler_meta
+            translations = parler_meta.root_rel_name
+            prefetches.append(Prefetch(
+                f"{lookup}__{translations}" if lookup else translations,
+                queryset=parler_meta.root_model.objects.filter(
+                    language_code__in=languages
+                    )
+            ))
+        queryset = self.prefetch_related(*prefetches)
+        queryset._translation_prefetch = (("",) + lookups, languages)
+        return queryset
+
+
+class TranslatedManager(TranslatableManager.from_queryset(TranslatedQuerySet)):
+    pass
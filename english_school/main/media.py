@@ -0,0 +1,52 @@
+from functools import lru_cache
+
+from cloudinary import CloudinaryResource
+
+
+# Distinct media files whose URL is kept per process.
+MEDIA_URL_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def storage_url(storage, name):
+    return storage.url(name)
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def resource_url(public_id, format, version, type, resource_type):
+    return CloudinaryResource(
+        public_id,
+        format=format,
+        version=version,
+        type=type,
+        resource_type=resource_type,
+    ).url
+
+
+def file_url(field_file):
+    """
+    Return the URL of a FileField value, or None if it is empty.
+
+    Storage URLs only depend on the file name, and a replaced file gets a
+    new name, so they are memoized per storage and name instead of being
+    built for every serialized row.
+    """
+    if not field_file:
+        return None
+    return storage_url(field_file.storage, field_file.name)
+
+
+def cloudinary_url(resource):
+    """
+    Return the URL of a CloudinaryField value, or None if it is empty,
+    memoized per public id, version and format.
+    """
+    if not resource or not resource.public_id:
+        return None
+    return resource_url(
+        resource.public_id,
+        resource.format,
+        resource.version,
+        resource.type,
+        resource.resource_type,
+    )
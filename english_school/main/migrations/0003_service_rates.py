@@ -0,0 +1,24 @@
+# Generated by Django 4.1 on 2026-10-18 15:02
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='read_rate',
+            field=models.CharField(blank=True, help_text='Наприклад 600/min. Порожнє - типовий ліміт.', max_length=20, validators=[django.core.validators.RegexValidator('^\\d+/(s|sec|m|min|h|hour|d|day)$', 'Формат: кількість/період, наприклад 600/min.')], verbose_name='Ліміт запитів на читання'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='write_rate',
+            field=models.CharField(blank=True, help_text='Наприклад 20/min. Порожнє - типовий ліміт.', max_length=20, validators=[django.core.validators.RegexValidator('^\\d+/(s|sec|m|min|h|hour|d|day)$', 'Формат: кількість/період, наприклад 600/min.')], verbose_name='Ліміт запитів на запис'),
+        ),
+    ]
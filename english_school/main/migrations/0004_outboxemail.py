@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2026-10-18 15:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_service_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('message', models.TextField(verbose_name='Повідомлення')),
+                ('from_email', models.CharField(blank=True, help_text='Порожнє - DEFAULT_FROM_EMAIL.', max_length=254, verbose_name='Відправник')),
+                ('recipients', models.JSONField(verbose_name='Отримувачі')),
+                ('status', models.CharField(choices=[('pending', 'Очікує'), ('sent', 'Надіслано'), ('failed', 'Помилка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Спроби')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Наступна спроба')),
+                ('last_error', models.TextField(blank=True, verbose_name='Остання помилка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Час створення')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='Час надсилання')),
+            ],
+            options={
+                'verbose_name': 'Лист у черзі',
+                'verbose_name_plural': 'Черга листів',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxemail',
+            index=models.Index(fields=['status', 'next_attempt'], name='main_outbox_status_b77844_idx'),
+        ),
+    ]
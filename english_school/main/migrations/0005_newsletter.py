@@ -0,0 +1,55 @@
+# Generated by Django 4.1 on 2026-10-18 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0004_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Newsletter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('content', models.TextField(verbose_name='Повідомлення')),
+                ('status', models.CharField(choices=[('queued', 'В черзі'), ('sending', 'Надсилається'), ('done', 'Завершено')], default='queued', max_length=10, verbose_name='Статус')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Час створення')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Час завершення')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='newsletters_created', to=settings.AUTH_USER_MODEL, verbose_name='Створив(ла)')),
+            ],
+            options={
+                'verbose_name': 'Розсилка',
+                'verbose_name_plural': 'Розсилки',
+            },
+        ),
+        migrations.CreateModel(
+            name='NewsletterDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, verbose_name='Електрона пошта')),
+                ('status', models.CharField(choices=[('pending', 'Очікує'), ('sent', 'Надіслано'), ('failed', 'Помилка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('error', models.TextField(blank=True, verbose_name='Помилка')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='Час надсилання')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='main.newsletter', verbose_name='Розсилка')),
+            ],
+            options={
+                'verbose_name': 'Отримувач розсилки',
+                'verbose_name_plural': 'Отримувачі розсилки',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='newsletterdelivery',
+            index=models.Index(fields=['newsletter', 'status'], name='main_newsle_newslet_e08467_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='newsletterdelivery',
+            constraint=models.UniqueConstraint(fields=('newsletter', 'email'), name='unique_newsletter_email'),
+        ),
+    ]
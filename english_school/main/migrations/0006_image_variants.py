@@ -0,0 +1,33 @@
+# Generated by Django 4.1 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_newsletter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варіанти зображення'),
+        ),
+        migrations.AddField(
+            model_name='mainpage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варіанти зображення'),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варіанти зображення'),
+        ),
+        migrations.AddField(
+            model_name='teachercertificate',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варіанти зображення'),
+        ),
+    ]
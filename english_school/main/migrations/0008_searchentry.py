@@ -0,0 +1,149 @@
+# Generated by Django 4.1 on 2026-10-18 15:49
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+# SQLite: an FTS5 table over main_searchentry, kept in sync by triggers.
+# Diacritics are kept, removing them would fold "й" into "и" and "ї" into
+# "і".
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE main_searchentry_fts USING fts5(
+        title, body,
+        content='main_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 0'
+    )
+    """,
+    """
+    CREATE TRIGGER main_searchentry_fts_insert
+    AFTER INSERT ON main_searchentry BEGIN
+        INSERT INTO main_searchentry_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER main_searchentry_fts_delete
+    AFTER DELETE ON main_searchentry BEGIN
+        INSERT INTO main_searchentry_fts(main_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER main_searchentry_fts_update
+    AFTER UPDATE ON main_searchentry BEGIN
+        INSERT INTO main_searchentry_fts(main_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO main_searchentry_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS main_searchentry_fts_insert",
+    "DROP TRIGGER IF EXISTS main_searchentry_fts_delete",
+    "DROP TRIGGER IF EXISTS main_searchentry_fts_update",
+    "DROP TABLE IF EXISTS main_searchentry_fts",
+]
+
+# PostgreSQL: a GIN index on the weighted document main.search queries.
+# The "simple" configuration, PostgreSQL has no Ukrainian one.
+POSTGRESQL_INDEX = [
+    """
+    CREATE INDEX main_searchentry_fts ON main_searchentry USING gin ((
+        setweight(to_tsvector('simple', title), 'A')
+        || setweight(to_tsvector('simple', body), 'B')
+    ))
+    """,
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS main_searchentry_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+create_index = run({"sqlite": SQLITE_INDEX, "postgresql": POSTGRESQL_INDEX})
+drop_index = run({"sqlite": SQLITE_DROP, "postgresql": POSTGRESQL_DROP})
+
+
+def fill_index(apps, schema_editor):
+    """
+    Index the existing courses and teachers as main.search.rebuild_index
+    does, with the historical models.
+    """
+    db = schema_editor.connection.alias
+
+    def get_translations(name):
+        model = apps.get_model("main", name)
+        return model.objects.using(db).exclude(master=None).order_by("pk")
+
+    SearchEntry = apps.get_model("main", "SearchEntry")
+    entries = [
+        SearchEntry(
+            kind="course",
+            object_id=translation.master_id,
+            language_code=translation.language_code,
+            title=translation.name or "",
+            body=translation.description or "",
+        )
+        for translation in get_translations("CourseTranslation")
+    ]
+    # (teacher, language) -> body lines after the position.
+    lines = defaultdict(list)
+    for name, field in [
+            ("TeacherEducationTranslation", "education"),
+            ("TeacherNoteTranslation", "notes")]:
+        for translation in get_translations(name).select_related("master"):
+            key = translation.master.teacher_id, translation.language_code
+            lines[key].append(getattr(translation, field))
+    for translation in get_translations("TeacherTranslation"):
+        key = translation.master_id, translation.language_code
+        body = [translation.position, *lines[key]]
+        entries.append(SearchEntry(
+            kind="teacher",
+            object_id=translation.master_id,
+            language_code=translation.language_code,
+            title=translation.name or "",
+            body="\n".join(text for text in body if text),
+        ))
+    SearchEntry.objects.using(db).bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_assetdeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Курс'), ('teacher', 'Вчитель')], max_length=10, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(verbose_name="ID об'єкта")),
+                ('language_code', models.CharField(max_length=15, verbose_name='Мова')),
+                ('title', models.CharField(max_length=255, verbose_name='Заголовок')),
+                ('body', models.TextField(blank=True, verbose_name='Текст')),
+            ],
+            options={
+                'verbose_name': 'Запис пошуку',
+                'verbose_name_plural': 'Пошуковий індекс',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'language_code'), name='unique_search_entry'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
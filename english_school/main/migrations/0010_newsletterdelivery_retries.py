@@ -0,0 +1,24 @@
+# Generated by Django 4.1 on 2026-10-18 16:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_service_rate_nonzero'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Спроби'),
+        ),
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='next_attempt',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Наступна спроба'),
+        ),
+    ]
@@ -1,7 +1,7 @@
-import cloudinary
-
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import RegexValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from cloudinary.models import CloudinaryField
@@ -11,6 +11,13 @@ from parler.models import (
     TranslationDoesNotExist
 )
 
+from .managers import TranslatedManager
+
+
+RATE_VALIDATOR = RegexValidator(
+    r"^[1-9]\d*/(s|sec|m|min|h|hour|d|day)$",
+    _("Формат: кількість/період, наприклад 600/min.")
+)
 
 FORMAT_CHOICES = [
     ('online', _('Онлайн')),
@@ -49,6 +56,8 @@ class Category(TranslatableModel):
         verbose_name=_("Обновив(ла)"),
         )
 
+    objects = TranslatedManager()
+
     class Meta:
         verbose_name = _("Категорія")
         verbose_name_plural = _("Категорії")
@@ -114,6 +123,12 @@ class Course(TranslatableModel):
         upload_to="images/",
         null=True,
         verbose_name=_("Зображення"))
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Варіанти зображення")
+        )
     price_total = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -157,13 +172,7 @@ class Course(TranslatableModel):
         verbose_name=_("Час обновлення")
         )
 
-    def delete(self, *args, **kwargs):
-        if self.image:
-            # Get the public_id of the image from the Cloudinary URL
-            public_id = self.image.name.split('/')[-1].split('.')[0]
-            cloudinary.uploader.destroy(public_id)
-
-        super().delete(*args, **kwargs)
+    objects = TranslatedManager()
 
     class Meta:
         verbose_name = _("Курс")
@@ -226,6 +235,20 @@ class Service(models.Model):
         unique=True,
         verbose_name=_("Токен")
         )
+    read_rate = models.CharField(
+        max_length=20,
+        blank=True,
+        validators=[RATE_VALIDATOR],
+        help_text=_("Наприклад 600/min. Порожнє - типовий ліміт."),
+        verbose_name=_("Ліміт запитів на читання")
+        )
+    write_rate = models.CharField(
+        max_length=20,
+        blank=True,
+        validators=[RATE_VALIDATOR],
+        help_text=_("Наприклад 20/min. Порожнє - типовий ліміт."),
+        verbose_name=_("Ліміт запитів на запис")
+        )
     created_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -258,6 +281,12 @@ class MainPage(models.Model):
         blank=True,
         verbose_name=_("Зображення")
         )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Варіанти зображення")
+        )
     video = CloudinaryField(
         resource_type="video",
         null=True,
@@ -296,17 +325,6 @@ class MainPage(models.Model):
     def __str__(self) -> str:
         return f"{self.id}"
 
-    def delete(self, *args, **kwargs):
-        if self.image and self.image.url:
-            # Get the public_id of the image from the Cloudinary URL
-            public_id = self.image.name.split('/')[-1].split('.')[0]
-            cloudinary.uploader.destroy(public_id)
-        if self.video:
-            public_id = self.video.public_id
-            cloudinary.uploader.destroy(public_id)
-
-        super().delete(*args, **kwargs)
-
     class Meta:
         verbose_name = _("Головне медіа")
         verbose_name_plural = _("Головні медіа")
@@ -399,6 +417,12 @@ class Teacher(TranslatableModel):
         upload_to="images/",
         null=True,
         verbose_name=_("Зображення"))
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Варіанти зображення")
+        )
     created_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -424,13 +448,7 @@ class Teacher(TranslatableModel):
         verbose_name=_("Час обновлення")
         )
 
-    def delete(self, *args, **kwargs):
-        if self.image:
-            # Get the public_id of the image from the Cloudinary URL
-            public_id = self.image.name.split('/')[-1].split('.')[0]
-            cloudinary.uploader.destroy(public_id)
-
-        super().delete(*args, **kwargs)
+    objects = TranslatedManager()
 
     class Meta:
         verbose_name = _("Вчитель")
@@ -461,6 +479,8 @@ class TeacherEducation(TranslatableModel):
             )
     )
 
+    objects = TranslatedManager()
+
     def __str__(self) -> str:
         try:
             return self.education
@@ -486,6 +506,8 @@ class TeacherNote(TranslatableModel):
             )
     )
 
+    objects = TranslatedManager()
+
     def __str__(self) -> str:
         try:
             return self.notes
@@ -497,7 +519,7 @@ class TeacherNote(TranslatableModel):
         verbose_name_plural = _("Нотатки")
 
 
-class TeacherCertificate(TranslatableModel):
+class TeacherCertificate(models.Model):
     teacher = models.ForeignKey(
         Teacher,
         on_delete=models.CASCADE,
@@ -508,14 +530,12 @@ class TeacherCertificate(TranslatableModel):
         upload_to="certificates/",
         verbose_name=_("Зображення сертифіката")
     )
-
-    def delete(self, *args, **kwargs):
-        if self.image:
-            # Get the public_id of the image from the Cloudinary URL
-            public_id = self.image.name.split('/')[-1].split('.')[0]
-            cloudinary.uploader.destroy(public_id)
-
-        super().delete(*args, **kwargs)
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Варіанти зображення")
+        )
 
     def __str__(self) -> str:
         try:
@@ -526,3 +546,281 @@ class TeacherCertificate(TranslatableModel):
     class Meta:
         verbose_name = _("Сертифікат")
         verbose_name_plural = _("Сертифікати")
+
+
+class OutboxEmail(models.Model):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, _("Очікує")),
+        (SENT, _("Надіслано")),
+        (FAILED, _("Помилка")),
+    ]
+
+    subject = models.CharField(
+        max_length=255,
+        verbose_name=_("Тема")
+        )
+    message = models.TextField(
+        verbose_name=_("Повідомлення")
+        )
+    from_email = models.CharField(
+        max_length=254,
+        blank=True,
+        help_text=_("Порожнє - DEFAULT_FROM_EMAIL."),
+        verbose_name=_("Відправник")
+        )
+    recipients = models.JSONField(
+        verbose_name=_("Отримувачі")
+        )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name=_("Статус")
+        )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_("Спроби")
+        )
+    next_attempt = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("Наступна спроба")
+        )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_("Остання помилка")
+        )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Час створення")
+        )
+    sent = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Час надсилання")
+        )
+
+    def __str__(self) -> str:
+        return f"{self.id} {self.subject}"
+
+    class Meta:
+        verbose_name = _("Лист у черзі")
+        verbose_name_plural = _("Черга листів")
+        indexes = [
+            models.Index(fields=["status", "next_attempt"]),
+        ]
+
+
+class Newsletter(models.Model):
+    QUEUED = "queued"
+    SENDING = "sending"
+    DONE = "done"
+    STATUS_CHOICES = [
+        (QUEUED, _("В черзі")),
+        (SENDING, _("Надсилається")),
+        (DONE, _("Завершено")),
+    ]
+
+    subject = models.CharField(
+        max_length=255,
+        verbose_name=_("Тема")
+        )
+    content = models.TextField(
+        verbose_name=_("Повідомлення")
+        )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+        verbose_name=_("Статус")
+        )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Час створення")
+        )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='newsletters_created',
+        null=True,
+        blank=True,
+        verbose_name=_("Створив(ла)"),
+        )
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Час завершення")
+        )
+
+    def __str__(self) -> str:
+        return f"{self.id} {self.subject}"
+
+    class Meta:
+        verbose_name = _("Розсилка")
+        verbose_name_plural = _("Розсилки")
+
+
+class NewsletterDelivery(models.Model):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, _("Очікує")),
+        (SENT, _("Надіслано")),
+        (FAILED, _("Помилка")),
+    ]
+
+    newsletter = models.ForeignKey(
+        Newsletter,
+        on_delete=models.CASCADE,
+        related_name='deliveries',
+        verbose_name=_("Розсилка")
+        )
+    email = models.EmailField(
+        verbose_name=_("Електрона пошта")
+        )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name=_("Статус")
+        )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_("Спроби")
+        )
+    next_attempt = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("Наступна спроба")
+        )
+    error = models.TextField(
+        blank=True,
+        verbose_name=_("Помилка")
+        )
+    sent = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Час надсилання")
+        )
+
+    def __str__(self) -> str:
+        return self.email
+
+    class Meta:
+        verbose_name = _("Отримувач розсилки")
+        verbose_name_plural = _("Отримувачі розсилки")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["newsletter", "email"],
+                name="unique_newsletter_email"),
+        ]
+        indexes = [
+            models.Index(fields=["newsletter", "status"]),
+        ]
+
+
+class AssetDeletion(models.Model):
+    PENDING = "pending"
+    DELETED = "deleted"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, _("Очікує")),
+        (DELETED, _("Видалено")),
+        (FAILED, _("Помилка")),
+    ]
+
+    public_id = models.CharField(
+        max_length=255,
+        verbose_name=_("Public ID")
+        )
+    resource_type = models.CharField(
+        max_length=10,
+        default="image",
+        verbose_name=_("Тип ресурсу")
+        )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name=_("Статус")
+        )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_("Спроби")
+        )
+    next_attempt = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("Наступна спроба")
+        )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_("Остання помилка")
+        )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Час створення")
+        )
+    deleted = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Час видалення")
+        )
+
+    def __str__(self) -> str:
+        return f"{self.resource_type}/{self.public_id}"
+
+    class Meta:
+        verbose_name = _("Файл на видалення")
+        verbose_name_plural = _("Черга видалення файлів")
+        indexes = [
+            models.Index(fields=["status", "next_attempt"]),
+        ]
+
+
+class SearchEntry(models.Model):
+    """
+    One language of a searchable course or teacher. The rows are mirrored
+    into the full-text index by the database (see main.search).
+    """
+
+    COURSE = "course"
+    TEACHER = "teacher"
+    KIND_CHOICES = [
+        (COURSE, _("Курс")),
+        (TEACHER, _("Вчитель")),
+    ]
+
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES,
+        verbose_name=_("Тип")
+        )
+    object_id = models.PositiveIntegerField(
+        verbose_name=_("ID об'єкта")
+        )
+    language_code = models.CharField(
+        max_length=15,
+        verbose_name=_("Мова")
+        )
+    title = models.CharField(
+        max_length=255,
+        verbose_name=_("Заголовок")
+        )
+    body = models.TextField(
+        blank=True,
+        verbose_name=_("Текст")
+        )
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.object_id} {self.language_code}"
+
+    class Meta:
+        verbose_name = _("Запис пошуку")
+        verbose_name_plural = _("Пошуковий індекс")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id", "language_code"],
+                name="unique_search_entry"),
+        ]
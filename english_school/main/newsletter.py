@@ -0,0 +1,164 @@
+import time
+import logging
+
+from datetime import timedelta
+from itertools import islice
+from smtplib import SMTPRecipientsRefused
+
+from django.conf import settings
+from django.core.mail import (
+    BadHeaderError,
+    EmailMultiAlternatives,
+    get_connection
+)
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import Newsletter, NewsletterDelivery
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_CHUNK_SIZE = 2000
+
+
+def queue_newsletter(subject, content, subscribers, created_by=None):
+    """
+    Create a newsletter with one pending delivery per distinct address of
+    the ``subscribers`` queryset. Nothing is sent here, send_newsletters
+    does it.
+    """
+    emails = subscribers.order_by().values_list(
+        "email", flat=True).iterator(chunk_size=QUEUE_CHUNK_SIZE)
+    with transaction.atomic():
+        newsletter = Newsletter.objects.create(
+            subject=subject, content=content, created_by=created_by)
+        while chunk := list(islice(emails, QUEUE_CHUNK_SIZE)):
+            NewsletterDelivery.objects.bulk_create(
+                [
+                    NewsletterDelivery(newsletter=newsletter, email=email)
+                    for email in chunk
+                ],
+                ignore_conflicts=True)
+    return newsletter
+
+
+class Pacer:
+    """
+    Spread sends to at most ``rate`` per second, 0 means unthrottled.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_send = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        delay = self.next_send - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_send = max(self.next_send, time.monotonic()) + self.interval
+
+
+def claim_deliveries(newsletter, size):
+    """
+    Claim up to ``size`` due deliveries of ``newsletter`` by pushing their
+    next attempt past the lease, so concurrent senders never mail the same
+    recipient twice. A delivery whose sender died is picked up again once
+    the lease ends.
+    """
+    now = timezone.now()
+    lease_end = now + timedelta(seconds=settings.NEWSLETTER_LEASE)
+    due = newsletter.deliveries.filter(
+        status=NewsletterDelivery.PENDING, next_attempt__lte=now
+    ).order_by("pk").values_list("pk", "next_attempt")[:size]
+    claimed = [
+        pk for pk, next_attempt in due
+        if NewsletterDelivery.objects.filter(
+            pk=pk, next_attempt=next_attempt
+        ).update(next_attempt=lease_end)
+    ]
+    return list(NewsletterDelivery.objects.filter(pk__in=claimed).only(
+        "pk", "email", "attempts").order_by("pk"))
+
+
+def release(deliveries):
+    NewsletterDelivery.objects.filter(
+        pk__in=[delivery.pk for delivery in deliveries]
+    ).update(next_attempt=timezone.now())
+
+
+def retry_later(delivery, error, permanent=False):
+    delivery.attempts += 1
+    delivery.error = str(error)
+    if permanent or delivery.attempts >= settings.NEWSLETTER_MAX_ATTEMPTS:
+        delivery.status = NewsletterDelivery.FAILED
+        logger.error(f">>> Failed to send newsletter to {delivery}: {error}")
+    else:
+        delay = min(
+            settings.NEWSLETTER_RETRY_DELAY * 2 ** (delivery.attempts - 1),
+            settings.NEWSLETTER_MAX_RETRY_DELAY)
+        delivery.next_attempt = timezone.now() + timedelta(seconds=delay)
+        logger.warning(
+            f"Newsletter to {delivery} attempt {delivery.attempts} failed, "
+            f"retrying in {delay}s: {error}")
+    delivery.save(update_fields=[
+        "attempts", "error", "status", "next_attempt"])
+
+
+def send_newsletter(newsletter, batch_size=None, rate=None):
+    """
+    Send the due deliveries of ``newsletter``, one message per recipient
+    and one SMTP connection per batch. Returns the (sent, failed) counts.
+
+    Deliveries are claimed a batch at a time (see claim_deliveries) and
+    marked as soon as their message is handed to the server, so an
+    interrupted send resumes with the remaining recipients. An unexpected
+    error is counted as an attempt of the delivery being sent, which is
+    retried with a backoff and failed after NEWSLETTER_MAX_ATTEMPTS, then
+    propagates and releases the rest of the batch.
+    The newsletter is done once no delivery is pending.
+    """
+    batch_size = batch_size or settings.NEWSLETTER_BATCH_SIZE
+    if rate is None:
+        rate = settings.NEWSLETTER_RATE
+    pacer = Pacer(rate)
+    text = strip_tags(newsletter.content)
+    pending = newsletter.deliveries.filter(
+        status=NewsletterDelivery.PENDING)
+
+    Newsletter.objects.filter(pk=newsletter.pk).update(
+        status=Newsletter.SENDING)
+    sent = failed = 0
+    while batch := claim_deliveries(newsletter, batch_size):
+        with get_connection() as connection:
+            for i, delivery in enumerate(batch):
+                pacer.wait()
+                message = EmailMultiAlternatives(
+                    newsletter.subject, text, to=[delivery.email],
+                    connection=connection)
+                message.attach_alternative(newsletter.content, "text/html")
+                try:
+                    message.send()
+                except (SMTPRecipientsRefused, BadHeaderError) as e:
+                    retry_later(delivery, e, permanent=True)
+                    failed += 1
+                except Exception as e:
+                    retry_later(delivery, e)
+                    release(batch[i + 1:])
+                    raise
+                else:
+                    NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+                        status=NewsletterDelivery.SENT,
+                        attempts=delivery.attempts + 1,
+                        sent=timezone.now())
+                    sent += 1
+        logger.info(
+            f"Newsletter {newsletter.pk}: {sent} sent, {failed} failed")
+
+    if not pending.exists():
+        Newsletter.objects.filter(pk=newsletter.pk).update(
+            status=Newsletter.DONE, finished=timezone.now())
+    return sent, failed
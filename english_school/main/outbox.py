@@ -0,0 +1,109 @@
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import BadHeaderError, EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """
+    Store an email for the send_outbox worker.
+
+    Call it inside the transaction writing the row the email is about, the
+    email then exists exactly when that row does. Without ``from_email``
+    the email is sent from DEFAULT_FROM_EMAIL.
+    """
+    return OutboxEmail.objects.create(
+        subject=str(subject),
+        message=message,
+        from_email=from_email or "",
+        recipients=list(recipient_list),
+    )
+
+
+def claim_batch(size):
+    """
+    Claim up to ``size`` due emails by pushing their next attempt past the
+    lease, so concurrent workers never send the same email. An email whose
+    worker died is picked up again once the lease ends.
+    """
+    now = timezone.now()
+    lease_end = now + timedelta(seconds=settings.OUTBOX_LEASE)
+    due = OutboxEmail.objects.filter(
+        status=OutboxEmail.PENDING, next_attempt__lte=now
+    ).order_by("next_attempt").values_list("pk", "next_attempt")[:size]
+    claimed = [
+        pk for pk, next_attempt in due
+        if OutboxEmail.objects.filter(
+            pk=pk, next_attempt=next_attempt
+        ).update(next_attempt=lease_end)
+    ]
+    return list(OutboxEmail.objects.filter(pk__in=claimed).order_by("pk"))
+
+
+def retry_later(email, error, permanent=False):
+    email.attempts += 1
+    email.last_error = str(error)
+    if permanent or email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboxEmail.FAILED
+        logger.error(f">>> Failed to send email {email.pk}: {error}")
+    else:
+        delay = min(
+            settings.OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1),
+            settings.OUTBOX_MAX_RETRY_DELAY)
+        email.next_attempt = timezone.now() + timedelta(seconds=delay)
+        logger.warning(
+            f"Email {email.pk} attempt {email.attempts} failed, "
+            f"retrying in {delay}s: {error}")
+    email.save(update_fields=[
+        "attempts", "last_error", "status", "next_attempt"])
+
+
+def send_batch(size=50):
+    """
+    Send one batch of due emails over a single SMTP connection.
+    Returns the (sent, failed) counts.
+    """
+    emails = claim_batch(size)
+    if not emails:
+        return 0, 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in emails:
+            retry_later(email, e)
+        return 0, len(emails)
+
+    sent = 0
+    try:
+        for email in emails:
+            try:
+                EmailMessage(
+                    email.subject,
+                    email.message,
+                    email.from_email,
+                    email.recipients,
+                    connection=connection,
+                ).send()
+            except BadHeaderError as e:
+                retry_later(email, e, permanent=True)
+            except Exception as e:
+                retry_later(email, e)
+            else:
+                email.status = OutboxEmail.SENT
+                email.attempts += 1
+                email.sent = timezone.now()
+                email.save(update_fields=["status", "attempts", "sent"])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, len(emails) - sent
@@ -0,0 +1,240 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+
+from parler.models import TranslatedFieldsModel
+
+from .models import (
+    Course,
+    SearchEntry,
+    Teacher,
+    TeacherEducation,
+    TeacherNote
+)
+
+
+# Searchable model -> SearchEntry.kind.
+SEARCH_KINDS = {
+    Course: SearchEntry.COURSE,
+    Teacher: SearchEntry.TEACHER,
+}
+
+# Models whose rows are part of a searchable document.
+INDEXED_MODELS = [
+    Course,
+    Teacher,
+    TeacherEducation,
+    TeacherNote,
+]
+
+# Words of a query that are searched for, longer queries are cut.
+MAX_QUERY_WORDS = 10
+
+word_re = re.compile(r"\w+")
+
+
+def get_indexed_object(sender, instance):
+    """
+    Return the (searchable model, pk) whose document contains ``instance``,
+    a row (or a translation) of one of INDEXED_MODELS.
+    """
+    if isinstance(instance, TranslatedFieldsModel):
+        if sender in SEARCH_KINDS:
+            return sender, instance.master_id
+        try:
+            instance = instance.master
+        except ObjectDoesNotExist:
+            return Teacher, None
+    if sender in SEARCH_KINDS:
+        return sender, instance.pk
+    # Educations and notes are part of their teacher's document.
+    return Teacher, instance.teacher_id
+
+
+def get_translations(obj):
+    return {
+        translation.language_code: translation
+        for translation in obj.translations.all()
+    }
+
+
+def get_course_entries(pks):
+    courses = Course.objects.filter(pk__in=pks).prefetch_related(
+        "translations")
+    for course in courses:
+        for language, translation in get_translations(course).items():
+            yield SearchEntry(
+                kind=SearchEntry.COURSE,
+                object_id=course.pk,
+                language_code=language,
+                title=translation.name or "",
+                body=translation.description or "",
+            )
+
+
+def get_teacher_entries(pks):
+    teachers = Teacher.objects.filter(pk__in=pks).prefetch_related(
+        "translations",
+        "teacher_educations__translations",
+        "teacher_notes__translations",
+    )
+    for teacher in teachers:
+        educations = [
+            get_translations(education)
+            for education in teacher.teacher_educations.all()]
+        notes = [
+            get_translations(note) for note in teacher.teacher_notes.all()]
+        for language, translation in get_translations(teacher).items():
+            body = [translation.position]
+            body += [
+                education[language].education
+                for education in educations if language in education]
+            body += [
+                note[language].notes for note in notes if language in note]
+            yield SearchEntry(
+                kind=SearchEntry.TEACHER,
+                object_id=teacher.pk,
+                language_code=language,
+                title=translation.name or "",
+                # Optional fields are stored as NULL.
+                body="\n".join(text for text in body if text),
+            )
+
+
+ENTRY_BUILDERS = {
+    Course: get_course_entries,
+    Teacher: get_teacher_entries,
+}
+
+
+def update_index(model, pks):
+    """
+    Rebuild the search entries of the ``model`` rows ``pks``, dropping
+    those of deleted rows.
+    """
+    pks = list(pks)
+    with transaction.atomic():
+        SearchEntry.objects.filter(
+            kind=SEARCH_KINDS[model], object_id__in=pks).delete()
+        SearchEntry.objects.bulk_create(ENTRY_BUILDERS[model](pks))
+
+
+def rebuild_index():
+    """
+    Rebuild the whole search index. Returns the number of entries.
+    """
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        for model in SEARCH_KINDS:
+            update_index(model, model.objects.values_list("pk", flat=True))
+        return SearchEntry.objects.count()
+
+
+def get_words(text):
+    return word_re.findall(text)[:MAX_QUERY_WORDS]
+
+
+def get_scopes(querysets):
+    """
+    Return the SQL restricting entries to the rows of ``querysets`` (by
+    kind), and its parameters.
+    """
+    conditions, params = [], []
+    for kind, queryset in querysets.items():
+        subquery, subquery_params = queryset.order_by().values(
+            "pk").query.sql_with_params()
+        conditions.append(
+            f"(entry.kind = %s AND entry.object_id IN ({subquery}))")
+        params += [kind, *subquery_params]
+    return " OR ".join(conditions), params
+
+
+def search(text, querysets=None, limit=None):
+    """
+    Return the (kind, object id, score) of the courses and teachers whose
+    document, in any language, contains every word of ``text`` (as a
+    prefix), best first. Titles weigh more than the body, an object scores
+    as its best language.
+
+    ``querysets`` maps the kinds searched to the rows that may match, by
+    default every course and teacher.
+    """
+    words = get_words(text)
+    if not words:
+        return []
+    if querysets is None:
+        querysets = {
+            kind: model.objects.all() for model, kind in SEARCH_KINDS.items()}
+    scopes, scope_params = get_scopes(querysets)
+    if connection.vendor == "postgresql":
+        sql = search_postgresql_sql(scopes)
+        query = " & ".join(f"{word}:*" for word in words)
+    else:
+        sql = search_sqlite_sql(scopes)
+        query = " ".join(f'"{word}"*' for word in words)
+    params = [query, *scope_params]
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            (kind, object_id, float(score))
+            for kind, object_id, score in cursor.fetchall()
+        ]
+
+
+def search_sqlite_sql(scopes):
+    # rank is bm25() with these weights, lower for better matches. Unlike
+    # bm25() it can be aggregated outside the MATCH query.
+    return f"""
+        SELECT entry.kind, entry.object_id, MAX(-match.rank) AS score
+        FROM (
+            SELECT rowid, rank FROM main_searchentry_fts
+            WHERE main_searchentry_fts MATCH %s
+                AND rank MATCH 'bm25(10.0, 1.0)'
+        ) AS match
+        JOIN main_searchentry AS entry ON entry.id = match.rowid
+        WHERE ({scopes})
+        GROUP BY entry.kind, entry.object_id
+        ORDER BY score DESC, entry.kind, entry.object_id
+    """
+
+
+def search_postgresql_sql(scopes):
+    # The document expression of the main_searchentry_fts index.
+    document = (
+        "setweight(to_tsvector('simple', entry.title), 'A') "
+        "|| setweight(to_tsvector('simple', entry.body), 'B')"
+    )
+    return f"""
+        SELECT entry.kind, entry.object_id,
+               MAX(ts_rank({document}, query)) AS score
+        FROM main_searchentry AS entry, to_tsquery('simple', %s) AS query
+        WHERE ({document}) @@ query AND ({scopes})
+        GROUP BY entry.kind, entry.object_id
+        ORDER BY score DESC, entry.kind, entry.object_id
+    """
+
+
+def search_ids(queryset, text):
+    """
+    Return the pks of the rows of ``queryset`` matching ``text``, best
+    first.
+    """
+    matches = search(text, {SEARCH_KINDS[queryset.model]: queryset})
+    return [object_id for kind, object_id, score in matches]
+
+
+def get_search_limit(value):
+    """
+    Return the number of results asked for by ``value`` (a query
+    parameter), within SEARCH_MAX_RESULTS.
+    """
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return settings.SEARCH_RESULTS
+    return max(1, min(limit, settings.SEARCH_MAX_RESULTS))
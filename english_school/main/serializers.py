@@ -1,5 +1,8 @@
+from django.db import models
 from rest_framework import serializers
 
+from .images import get_image_sources
+from .media import cloudinary_url, file_url, storage_url
 from .models import (
     Category,
     Course,
@@ -14,20 +17,72 @@ from .models import (
 )
 
 
+def absolute_url(url, context):
+    request = context.get("request")
+    if url is not None and request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class MediaImageField(serializers.ImageField):
+    """
+    ImageField serialized to its memoized storage URL (main.media).
+    """
+
+    def to_representation(self, value):
+        return absolute_url(file_url(value), self.context)
+
+
+class MediaModelSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: MediaImageField,
+    }
+
+
+class ImageSourcesField(serializers.Field):
+    """
+    The responsive derivatives of ``image`` (main.images) as ``<picture>``
+    sources with a ``srcset`` each, or None until they are built.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "image_variants"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        storage = self.parent.Meta.model._meta.get_field("image").storage
+
+        def build_url(name):
+            return absolute_url(storage_url(storage, name), self.context)
+
+        return get_image_sources(variants, build_url)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "name", "slug"]
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(MediaModelSerializer):
+    category = serializers.SerializerMethodField()
+    image_sources = ImageSourcesField()
+
     class Meta:
         model = Course
         fields = [
-            "id", "category", "name", "slug", "image", "model", "group",
+            "id", "category", "name", "slug", "image", "image_sources",
+            "model", "group",
             "format", "price_total", "price_mounth", "message", "description"
             ]
 
+    def get_category(self, obj):
+        # The category is expected to be loaded with the course
+        # (select_related + prefetched translations), so no extra queries.
+        return CategorySerializer(obj.category, context=self.context).data
+
 
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -35,17 +90,16 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ["content", "author"]
 
 
-class MainPageSerializer(serializers.ModelSerializer):
+class MainPageSerializer(MediaModelSerializer):
     video = serializers.SerializerMethodField()
+    image_sources = ImageSourcesField()
 
     class Meta:
         model = MainPage
-        fields = ["id", "image", "video"]
+        fields = ["id", "image", "image_sources", "video"]
 
     def get_video(self, obj):
-        if obj.video:
-            return obj.video.url
-        return None
+        return cloudinary_url(obj.video)
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -74,20 +128,26 @@ class TeacherNoteSerializer(serializers.ModelSerializer):
         fields = ["notes"]
 
 
-class TeacherCertificateSerializer(serializers.ModelSerializer):
+class TeacherCertificateSerializer(MediaModelSerializer):
+    image_sources = ImageSourcesField()
+
     class Meta:
         model = TeacherCertificate
-        fields = ["image"]
+        fields = ["image", "image_sources"]
 
 
-class TeacherSerializer(serializers.ModelSerializer):
-    educations = TeacherEducationSerializer(many=True, read_only=True)
-    notes = TeacherNoteSerializer(many=True, read_only=True)
-    certificates = TeacherCertificateSerializer(many=True, read_only=True)
+class TeacherSerializer(MediaModelSerializer):
+    educations = TeacherEducationSerializer(
+        source="teacher_educations", many=True, read_only=True)
+    notes = TeacherNoteSerializer(
+        source="teacher_notes", many=True, read_only=True)
+    certificates = TeacherCertificateSerializer(
+        source="teacher_certificates", many=True, read_only=True)
+    image_sources = ImageSourcesField()
 
     class Meta:
         model = Teacher
         fields = [
-            "name", "position", "slug", "image",
+            "name", "position", "slug", "image", "image_sources",
             "educations", "notes", "certificates"
             ]
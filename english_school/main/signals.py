@@ -0,0 +1,177 @@
+import logging
+
+from threading import local
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from parler.signals import post_translation_delete, post_translation_save
+
+from .assets import enqueue_deletions, get_assets
+from .cache import bump_version
+from .images import update_derivatives
+from .search import INDEXED_MODELS, get_indexed_object, update_index
+from .snapshots import refresh_snapshots
+from .models import (
+    Category,
+    Course,
+    Comment,
+    MainPage,
+    SearchEntry,
+    Service,
+    Teacher,
+    TeacherCertificate,
+    TeacherEducation,
+    TeacherNote
+)
+
+
+CACHED_MODELS = [
+    Category,
+    Course,
+    Comment,
+    MainPage,
+    Service,
+    Teacher,
+    TeacherCertificate,
+    TeacherEducation,
+    TeacherNote,
+]
+
+IMAGE_MODELS = [
+    Course,
+    MainPage,
+    Teacher,
+    TeacherCertificate,
+]
+
+logger = logging.getLogger(__name__)
+
+_changed = local()
+
+_indexed = local()
+
+
+def refresh_cached_responses():
+    models = getattr(_changed, "models", set())
+    _changed.models = set()
+    for model in models:
+        bump_version(model)
+    if models:
+        refresh_snapshots(models)
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    # Parler translation signals are sent with the shared model as sender.
+    if not transaction.get_connection().in_atomic_block:
+        # In autocommit every save is committed on its own, a parler save
+        # twice. Only the version is bumped then, the snapshots are built
+        # by the next request instead of once per signal.
+        bump_version(sender)
+        return
+    # The refresh waits for the commit, otherwise a concurrent request
+    # could cache the old rows under the new version. One admin save emits
+    # many signals, they are collected and refreshed once.
+    if not hasattr(_changed, "models"):
+        _changed.models = set()
+    _changed.models.add(sender)
+    transaction.on_commit(refresh_cached_responses)
+
+
+def note_image_upload(sender, instance, **kwargs):
+    # Sent before FileField.pre_save stores the upload.
+    instance._image_uploaded = (
+        bool(instance.image) and not instance.image._committed)
+
+
+def refresh_image_derivatives(sender, instance, raw=False, **kwargs):
+    # Built for new uploads and dropped with the image. Images set by name
+    # are left to "manage.py build_image_derivatives".
+    if raw or (instance.image and not instance._image_uploaded):
+        return
+    try:
+        update_derivatives(instance)
+    except Exception as e:
+        # The original image is still served.
+        logger.error(f">>> Failed to build image derivatives: {e}")
+
+
+def queue_asset_deletion(sender, instance, **kwargs):
+    # Sent for every row of a queryset delete too. Queued in the deleting
+    # transaction, "manage.py delete_assets" deletes them in batches.
+    assets = get_assets(instance)
+    if assets:
+        enqueue_deletions(assets)
+
+
+def refresh_search_index():
+    objects = getattr(_indexed, "objects", {})
+    _indexed.objects = {}
+    for model, pks in objects.items():
+        try:
+            update_index(model, pks)
+        except Exception as e:
+            # Fixed by "manage.py rebuild_search_index".
+            logger.error(f">>> Failed to update the search index: {e}")
+    if objects:
+        # Search responses are cached under the index version, bumped
+        # once the index is up to date.
+        invalidate_cached_responses(SearchEntry)
+
+
+def update_search_index(sender, instance, **kwargs):
+    # Like the cache refresh, collected and run once the transaction
+    # commits, so a teacher saved with all its inlines is indexed once.
+    model, pk = get_indexed_object(sender, instance)
+    if pk is None:
+        return
+    if not hasattr(_indexed, "objects"):
+        _indexed.objects = {}
+    _indexed.objects.setdefault(model, set()).add(pk)
+    transaction.on_commit(refresh_search_index)
+
+
+# Connected first, so the derivatives are on the row before the cache
+# refresh below reads it.
+for model in IMAGE_MODELS:
+    pre_save.connect(
+        note_image_upload,
+        sender=model,
+        dispatch_uid=f"note_image_upload.{model.__name__}",
+    )
+    post_save.connect(
+        refresh_image_derivatives,
+        sender=model,
+        dispatch_uid=f"refresh_image_derivatives.{model.__name__}",
+    )
+    post_delete.connect(
+        queue_asset_deletion,
+        sender=model,
+        dispatch_uid=f"queue_asset_deletion.{model.__name__}",
+    )
+
+for model in CACHED_MODELS:
+    for signal in (
+        post_save,
+        post_delete,
+        post_translation_save,
+        post_translation_delete,
+    ):
+        signal.connect(
+            invalidate_cached_responses,
+            sender=model,
+            dispatch_uid=f"invalidate_cached_responses.{model.__name__}",
+        )
+
+for model in INDEXED_MODELS:
+    for signal in (
+        post_save,
+        post_delete,
+        post_translation_save,
+        post_translation_delete,
+    ):
+        signal.connect(
+            update_search_index,
+            sender=model,
+            dispatch_uid=f"update_search_index.{model.__name__}",
+        )
@@ -0,0 +1,143 @@
+import re
+import gzip
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+
+from rest_framework.renderers import JSONRenderer
+
+from .cache import aget_versions, conditional_response, get_versions
+
+
+logger = logging.getLogger(__name__)
+
+accepts_gzip = re.compile(r"\bgzip\b")
+
+
+def get_languages():
+    return [language["code"] for language in settings.PARLER_LANGUAGES[None]]
+
+
+def get_snapshot_viewsets():
+    """
+    Return (prefix, viewset) for every routed viewset serving snapshots.
+    """
+    from .urls import router
+
+    return [
+        (prefix, viewset)
+        for prefix, viewset, basename in router.registry
+        if issubclass(viewset, SnapshotListMixin)
+    ]
+
+
+def snapshot_key(viewset, language):
+    versions = ".".join(get_versions(viewset.snapshot_models))
+    return f"snapshot.{viewset.__name__}.{language}.{versions}"
+
+
+async def asnapshot_key(viewset, language):
+    versions = ".".join(await aget_versions(viewset.snapshot_models))
+    return f"snapshot.{viewset.__name__}.{language}.{versions}"
+
+
+def build_snapshot(viewset, language, key=None):
+    """
+    Serialize the list payload of ``viewset`` in ``language`` and store
+    the JSON bytes together with their gzip-compressed copy under ``key``.
+
+    The key, by default the current one, must be worked out before the
+    rows are read: a write committed meanwhile bumps the version, and the
+    old rows must not be stored under the new one.
+    """
+    if key is None:
+        key = snapshot_key(viewset, language)
+    with translation.override(language):
+        view = viewset(request=None, format_kwarg=None, action="list")
+        queryset = view.filter_queryset(view.get_queryset())
+        data = view.get_serializer(queryset, many=True).data
+        content = JSONRenderer().render(data)
+    snapshot = (content, gzip.compress(content))
+    cache.set(key, snapshot, settings.API_CACHE_TIMEOUT)
+    return snapshot
+
+
+async def aget_snapshot(viewset, language):
+    key = await asnapshot_key(viewset, language)
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        snapshot = await sync_to_async(build_snapshot)(viewset, language, key)
+    return snapshot
+
+
+def get_snapshot(viewset, language):
+    key = snapshot_key(viewset, language)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(viewset, language, key)
+    return snapshot
+
+
+def rebuild_snapshots(models=None):
+    """
+    Rebuild the snapshots depending on any of ``models`` (all if None)
+    in every language. Returns the rebuilt (prefix, language) pairs.
+    """
+    rebuilt = []
+    for prefix, viewset in get_snapshot_viewsets():
+        if models is not None and not set(models) & set(
+                viewset.snapshot_models):
+            continue
+        for language in get_languages():
+            build_snapshot(viewset, language)
+            rebuilt.append((prefix, language))
+    return rebuilt
+
+
+def refresh_snapshots(models):
+    try:
+        rebuild_snapshots(models)
+    except Exception as e:
+        # The snapshot is built on the next request instead.
+        logger.error(f">>> Failed to rebuild snapshots: {e}")
+
+
+class SnapshotListMixin:
+    """
+    Serve ``list`` from a pre-rendered snapshot of the JSON payload.
+
+    ``snapshot_models`` are the models the payload is built from, a change
+    to any of them bumps its cache version and rebuilds the snapshot. They
+    also provide the ETag and Last-Modified of the list.
+    """
+
+    snapshot_models = []
+
+    def list(self, request, *args, **kwargs):
+        list_view = conditional_response(*self.snapshot_models)(
+            self.list_snapshot)
+        return list_view(request, *args, **kwargs)
+
+    def list_snapshot(self, request, *args, **kwargs):
+        language = translation.get_language()
+        if (
+            request.accepted_renderer.format != "json"
+            or language not in get_languages()
+        ):
+            return super().list(request, *args, **kwargs)
+
+        content, compressed = get_snapshot(type(self), language)
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if accepts_gzip.search(accept_encoding):
+            response = HttpResponse(
+                compressed, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(content, content_type="application/json")
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
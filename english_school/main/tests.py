@@ -1,3 +1,1899 @@
-from django.test import TestCase
+import os
+import csv
+import gzip
+import random
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from importlib import import_module
+from io import BytesIO, StringIO
+from smtplib import (
+    SMTPException,
+    SMTPRecipientsRefused,
+    SMTPServerDisconnected
+)
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage, get_connection
+from django.forms import BooleanField, FileField
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.conf.urls.i18n import i18n_patterns
+from django.urls import include, path, reverse
+from django.utils import timezone, translation
+from django.utils.http import http_date
+
+from cloudinary import CloudinaryResource
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from .admin import (
+    ContactAdmin,
+    CourseAdmin,
+    MainPageAdmin,
+    ServiceAdmin,
+    SubscriptionEmailAdmin,
+    export_to_csv,
+    export_to_csv_gzip
+)
+from .assets import enqueue_deletions
+from .authentication import service_tokens
+from .media import resource_url, storage_url
+from .serializers import CourseSerializer, MainPageSerializer
+from .archive import ArchiveError, BackupArchive
+from .benchmarks import format_latencies
+from .urls import async_urlpatterns
+from .warmup import WarmupRequest, get_default_host
+from .cache import bump_version
+from .cache_backends import SQLiteCache, TieredCache
+from .newsletter import claim_deliveries, queue_newsletter
+from .outbox import claim_batch, enqueue_email
+from .search import rebuild_index
+from .throttling import ServiceRateThrottle
+from .models import (
+    AssetDeletion,
+    Category,
+    Course,
+    Comment,
+    Contact,
+    MainPage,
+    Newsletter,
+    NewsletterDelivery,
+    OutboxEmail,
+    SearchEntry,
+    Service,
+    SubscriptionEmail,
+    Teacher,
+    TeacherCertificate,
+    TeacherEducation,
+    TeacherNote
+)
+from writingApp.models import TextEditor
+
+
+SERVICE_SITE_NAME = "site"
+
+# The async read views under /async/, next to the DRF ones.
+urlpatterns = i18n_patterns(
+    path("async/", include(async_urlpatterns)),
+    path("", include("main.urls")),
+)
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+        }
+    },
+    DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+)
+class APITestCase(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(
+            os.environ, {"SERVICE_SITE_NAME": SERVICE_SITE_NAME})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = Service.objects.create(
+            name=SERVICE_SITE_NAME, token="test-token")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test-token")
+
+    def create_rows(self, count):
+        # Requests leave their language active, create rows in the default.
+        with translation.override("uk"), \
+                self.captureOnCommitCallbacks(execute=True):
+            self._create_rows(count)
+
+    def _create_rows(self, count):
+        offset = Course.objects.count()
+        for i in range(offset, offset + count):
+            category = Category.objects.create(
+                name=f"Категорія {i}", slug=f"category-{i}")
+            category.set_current_language("en")
+            category.name = f"Category {i}"
+            category.save()
+            Course.objects.create(
+                category=category,
+                name=f"Курс {i}",
+                slug=f"course-{i}",
+                time="3",
+                model="4",
+                group="8",
+                price_total=1000,
+                price_mounth=250,
+                main_page=True,
+            )
+            Comment.objects.create(content="Відгук", author=f"Автор {i}")
+            MainPage.objects.create()
+            teacher = Teacher.objects.create(
+                name=f"Вчитель {i}",
+                position="Викладач",
+                slug=f"teacher-{i}",
+            )
+            for j in range(2):
+                TeacherEducation.objects.create(
+                    teacher=teacher, education=f"Освіта {j}")
+                TeacherNote.objects.create(
+                    teacher=teacher, notes=f"Нотатка {j}")
+                TeacherCertificate.objects.create(
+                    teacher=teacher, image=f"certificates/{i}-{j}.jpg")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(context.captured_queries)
+
+
+class ReadEndpointQueryCountTests(APITestCase):
+    endpoints = [
+        "categories",
+        "main-courses",
+        "courses",
+        "comments",
+        "medias",
+        "teachers",
+    ]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.create_rows(2)
+        baseline = {
+            (language, endpoint): self.count_queries(
+                f"/{language}/api/{endpoint}/")
+            for language in ("uk", "en")
+            for endpoint in self.endpoints
+        }
+
+        self.create_rows(20)
+        for (language, endpoint), expected in baseline.items():
+            url = f"/{language}/api/{endpoint}/"
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected)
+
+    def test_prefetched_translations_skip_the_shared_cache(self):
+        self.create_rows(2)
+        names = [
+            "_cache_translation",
+            "_cache_translation_needs_fallback",
+            "get_cached_translation",
+        ]
+        mocks = {}
+        for name in names:
+            patcher = mock.patch(f"parler.models.{name}")
+            mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        for language in ("uk", "en"):
+            for endpoint in self.endpoints:
+                self.count_queries(f"/{language}/api/{endpoint}/")
+        for name, cache_mock in mocks.items():
+            with self.subTest(name=name):
+                cache_mock.assert_not_called()
+
+    def test_course_list_embeds_translated_category(self):
+        self.create_rows(1)
+        response = self.client.get("/en/api/courses/")
+        course = response.json()[0]
+        self.assertEqual(course["category"]["name"], "Category 0")
+        # No English translation for the course, falls back to Ukrainian.
+        self.assertEqual(course["name"], "Курс 0")
+
+
+class AdminChangeListQueryCountTests(APITestCase):
+    changelists = [
+        "main_category",
+        "main_course",
+        "main_teacher",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser(
+            "admin", "admin@example.com", "password")
+        self.client.force_login(self.user)
+
+    def create_rows(self, count):
+        super().create_rows(count)
+        for model in (Category, Course, Teacher):
+            model.objects.update(created_by=self.user, updated_by=self.user)
+
+    def count_changelist_queries(self, language, changelist):
+        with translation.override(language):
+            url = reverse(f"admin:{changelist}_changelist")
+        return self.count_queries(url)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.create_rows(2)
+        baseline = {
+            (language, changelist): self.count_changelist_queries(
+                language, changelist)
+            for language in ("uk", "en")
+            for changelist in self.changelists
+        }
+
+        self.create_rows(20)
+        for (language, changelist), expected in baseline.items():
+            with self.subTest(language=language, changelist=changelist):
+                self.assertEqual(
+                    self.count_changelist_queries(language, changelist),
+                    expected)
+
+    def test_course_changelist_shows_translated_rows(self):
+        self.create_rows(1)
+        with translation.override("en"):
+            response = self.client.get(
+                reverse("admin:main_course_changelist"))
+        self.assertContains(response, "Курс 0")
+        self.assertContains(response, "Category 0")
+
+
+class TeacherChangeFormTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser(
+            "admin", "admin@example.com", "password"))
+        self.create_rows(1)
+        Teacher.objects.update(image="images/teacher.jpg")
+        self.teacher = Teacher.objects.get()
+        with translation.override("uk"):
+            self.url = reverse(
+                "admin:main_teacher_change", args=[self.teacher.pk])
+
+    def add_inline_rows(self, count):
+        with translation.override("uk"):
+            for i in range(count):
+                TeacherNote.objects.create(
+                    teacher=self.teacher, notes=f"Нотатка {i}")
+                TeacherEducation.objects.create(
+                    teacher=self.teacher, education=f"Освіта {i}")
+                TeacherCertificate.objects.create(
+                    teacher=self.teacher, image=f"certificates/{i}.jpg")
+
+    def get_form_data(self, response):
+        # The POST data of the change form as it was rendered.
+        forms = [response.context["adminform"].form]
+        for inline in response.context["inline_admin_formsets"]:
+            formset = inline.formset
+            forms += [formset.management_form, *formset.forms]
+        data = {}
+        for form in forms:
+            for name, field in form.fields.items():
+                value = form[name].value()
+                if isinstance(field, BooleanField):
+                    if value:
+                        data[form.add_prefix(name)] = "on"
+                elif not isinstance(field, FileField):
+                    data[form.add_prefix(name)] = getattr(
+                        value, "pk", "" if value is None else value)
+        return data
+
+    def edit_inline_rows(self, response, data, field, edit):
+        for inline in response.context["inline_admin_formsets"]:
+            for form in inline.formset.initial_forms:
+                if field in form.fields:
+                    name = form.add_prefix(field)
+                    data[name] = edit(data.get(name))
+
+    def count_requests(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        opened = len(context.captured_queries)
+
+        data = self.get_form_data(response)
+        self.edit_inline_rows(
+            response, data, "notes", lambda notes: f"{notes} (змінено)")
+        with CaptureQueriesContext(connection) as context, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        return opened, len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_inline_rows(self):
+        # The first save sets updated_by, shown on the later forms.
+        self.count_requests()
+        baseline = self.count_requests()
+        self.add_inline_rows(20)
+        self.assertEqual(self.count_requests(), baseline)
+
+    def test_inline_edits_are_saved(self):
+        self.add_inline_rows(3)
+        self.count_requests()
+        notes = TeacherNote.objects.values_list(
+            "translations__notes", flat=True)
+        self.assertEqual(len(notes), 5)
+        for note in notes:
+            self.assertTrue(note.endswith(" (змінено)"), note)
+        self.assertEqual(TeacherCertificate.objects.count(), 5)
+
+    def test_inline_rows_are_deleted(self):
+        response = self.client.get(self.url)
+        data = self.get_form_data(response)
+        self.edit_inline_rows(response, data, "DELETE", lambda delete: "on")
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(TeacherNote.objects.exists())
+        self.assertFalse(TeacherEducation.objects.exists())
+
+    def test_new_translations_are_created_and_invalidate_the_cache(self):
+        self.teacher.set_current_language("en")
+        self.teacher.name = "Teacher 0"
+        self.teacher.position = "Teacher"
+        self.teacher.save()
+        url = f"{self.url}?language=en"
+        response = self.client.get(url)
+        data = self.get_form_data(response)
+        self.edit_inline_rows(response, data, "notes", lambda notes: "Note")
+        self.edit_inline_rows(
+            response, data, "education", lambda education: "Education")
+
+        with mock.patch("main.signals.bump_version") as bump_version, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(TeacherNote.objects.filter(
+            translations__language_code="en",
+            translations__notes="Note").count(), 2)
+        self.assertIn(mock.call(TeacherNote), bump_version.call_args_list)
+
+    @override_settings(CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "teacher-change-form-tests",
+        }
+    })
+    def test_saved_translations_are_not_served_from_parlers_cache(self):
+        cache.clear()
+        note = TeacherNote.objects.first()
+        with translation.override("uk"):
+            # Cached by parler, it is not prefetched.
+            self.assertFalse(note.notes.endswith(" (змінено)"))
+        self.count_requests()
+        note = TeacherNote.objects.get(pk=note.pk)
+        with translation.override("uk"):
+            self.assertTrue(note.notes.endswith(" (змінено)"), note.notes)
+
+    def test_certificate_urls_are_memoized(self):
+        TeacherCertificate.objects.all().delete()
+        self.add_inline_rows(3)
+        storage_url.cache_clear()
+        self.client.get(self.url)
+        self.assertEqual(storage_url.cache_info().misses, 3)
+        response = self.client.get(self.url)
+        self.assertEqual(storage_url.cache_info().misses, 3)
+        self.assertContains(response, 'href="/media/certificates/2.jpg"')
+
+
+class TeacherEndpointTests(APITestCase):
+    def test_nested_lists_are_serialized(self):
+        self.create_rows(1)
+        teacher = self.client.get("/uk/api/teachers/").json()[0]
+        self.assertEqual(
+            [item["education"] for item in teacher["educations"]],
+            ["Освіта 0", "Освіта 1"])
+        self.assertEqual(
+            [item["notes"] for item in teacher["notes"]],
+            ["Нотатка 0", "Нотатка 1"])
+        self.assertEqual(len(teacher["certificates"]), 2)
+
+    def test_retrieve_by_slug_uses_the_same_prefetch_graph(self):
+        self.create_rows(1)
+        queries = self.count_queries("/en/api/teachers/teacher-0/")
+        self.create_rows(5)
+        self.assertEqual(
+            self.count_queries("/en/api/teachers/teacher-5/"), queries)
+        self.assertEqual(
+            self.client.get("/en/api/teachers/teacher-5/").json()["name"],
+            "Вчитель 5")
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        with translation.override("uk"), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.course = Course.objects.create(
+                name="Англійська для дітей",
+                slug="kids",
+                description="Граматика і розмова",
+                time="3",
+                model="4",
+                group="8",
+                price_total=1000,
+                price_mounth=250,
+            )
+            self.course.set_current_language("en")
+            self.course.name = "English for kids"
+            self.course.description = "Grammar and speaking"
+            self.course.save()
+            self.teacher = Teacher.objects.create(
+                name="Олена", position="Викладач англійської", slug="olena")
+            self.note = TeacherNote.objects.create(
+                teacher=self.teacher, notes="Розмовний клуб")
+
+    def test_migration_fills_the_index(self):
+        TeacherEducation.objects.create(
+            teacher=self.teacher, education="Університет")
+        entries = SearchEntry.objects.order_by(
+            "kind", "object_id", "language_code").values_list(
+            "kind", "object_id", "language_code", "title", "body")
+        rebuild_index()
+        indexed = list(entries)
+        SearchEntry.objects.all().delete()
+
+        migration = import_module("main.migrations.0008_searchentry")
+        migration.fill_index(apps, mock.Mock(connection=connection))
+        self.assertEqual(list(entries), indexed)
+        self.assertEqual(
+            self.search("?q=університет")[0]["object"]["slug"], "olena")
+
+    def search(self, query, language="uk"):
+        response = self.client.get(f"/{language}/api/search/{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_title_matches_rank_first(self):
+        results = self.search("?q=англ")
+        self.assertEqual(
+            [(result["type"], result["object"]["slug"]) for result in results],
+            [("course", "kids"), ("teacher", "olena")])
+        self.assertGreater(results[0]["score"], results[1]["score"])
+        self.assertEqual(results[0]["object"]["name"], "Англійська для дітей")
+
+    def test_every_language_is_searched(self):
+        results = self.search("?q=speak")
+        self.assertEqual([result["type"] for result in results], ["course"])
+        # Served in the requested language.
+        self.assertEqual(results[0]["object"]["name"], "Англійська для дітей")
+        results = self.search("?q=speak", language="en")
+        self.assertEqual(results[0]["object"]["name"], "English for kids")
+
+    def test_every_word_must_match(self):
+        self.assertEqual(len(self.search("?q=англійська граматика")), 1)
+        self.assertEqual(self.search("?q=англійська французька"), [])
+        self.assertEqual(self.search("?q="), [])
+
+    def test_optional_fields_are_indexed_empty(self):
+        with translation.override("uk"), \
+                self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(
+                name="Французька",
+                slug="french",
+                time="3",
+                model="4",
+                group="8",
+                price_total=1000,
+                price_mounth=250,
+            )
+        entry = SearchEntry.objects.get(
+            kind=SearchEntry.COURSE, object_id=course.pk)
+        self.assertEqual(entry.body, "")
+        self.assertEqual(
+            [result["object"]["slug"] for result in self.search("?q=франц")],
+            ["french"])
+
+    def test_index_follows_edits_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.notes = "Шаховий клуб"
+            self.note.save()
+        self.assertEqual(self.search("?q=розмовний"), [])
+        self.assertEqual(
+            [result["type"] for result in self.search("?q=шахов")],
+            ["teacher"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertEqual(
+            [result["type"] for result in self.search("?q=англ")],
+            ["teacher"])
+
+    def test_unavailable_courses_are_not_served(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.available = False
+            self.course.save()
+        self.assertEqual(
+            [result["type"] for result in self.search("?q=англ")],
+            ["teacher"])
+        # The best match is hidden, the limit still fills with the next.
+        self.assertEqual(
+            [result["type"] for result in self.search("?q=англ&limit=1")],
+            ["teacher"])
+
+    def test_type_and_limit(self):
+        results = self.search("?q=англ&type=teacher")
+        self.assertEqual([result["type"] for result in results], ["teacher"])
+        self.assertEqual(len(self.search("?q=англ&limit=1")), 1)
+        response = self.client.get("/uk/api/search/?q=англ&type=school")
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_search_uses_the_index(self):
+        self.client.force_login(User.objects.create_superuser(
+            "admin", "admin@example.com", "password"))
+        response = self.client.get(
+            "/uk/admin/main/teacher/", {"q": "клуб"})
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.teacher])
+        response = self.client.get(
+            "/uk/admin/main/course/", {"q": "kids"})
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.course])
+
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(self.search("?q=англ"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.search("?q=англ")), 2)
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "cache-invalidation-tests",
+    }
+})
+class CacheInvalidationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.create_rows(1)
+
+    def test_cached_response_is_served_until_the_model_changes(self):
+        self.client.get("/uk/api/courses/")
+        # Token from the process-local map, response from the cache.
+        self.assertEqual(self.count_queries("/uk/api/courses/"), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.get()
+            course.name = "Новий курс"
+            course.save()
+
+        response = self.client.get("/uk/api/courses/")
+        self.assertEqual(response.json()[0]["name"], "Новий курс")
+
+    def test_category_change_invalidates_courses(self):
+        self.client.get("/uk/api/courses/")
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.get()
+            category.name = "Нова категорія"
+            category.save()
+
+        response = self.client.get("/uk/api/courses/")
+        self.assertEqual(
+            response.json()[0]["category"]["name"], "Нова категорія")
+
+    def test_inline_change_invalidates_teachers(self):
+        self.client.get("/uk/api/teachers/")
+        with self.captureOnCommitCallbacks(execute=True):
+            TeacherNote.objects.filter(teacher__slug="teacher-0").delete()
+
+        response = self.client.get("/uk/api/teachers/")
+        self.assertEqual(response.json()[0]["notes"], [])
+
+    def test_unrelated_change_keeps_cached_response(self):
+        self.client.get("/uk/api/courses/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(content="Відгук", author="Автор")
+
+        self.assertEqual(self.count_queries("/uk/api/courses/"), 0)
+
+
+class AutocommitInvalidationTests(TransactionTestCase):
+    def setUp(self):
+        for name in ("bump_version", "refresh_snapshots"):
+            patcher = mock.patch(f"main.signals.{name}")
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def save_category(self):
+        with translation.override("uk"):
+            Category.objects.create(name="Категорія", slug="category")
+
+    def test_autocommit_save_rebuilds_no_snapshot(self):
+        self.save_category()
+        # The master and the translation are saved and committed apart.
+        self.assertEqual(self.bump_version.call_count, 2)
+        self.refresh_snapshots.assert_not_called()
+
+    def test_atomic_save_is_refreshed_once(self):
+        with transaction.atomic():
+            self.save_category()
+        self.bump_version.assert_called_once_with(Category)
+        self.refresh_snapshots.assert_called_once_with({Category})
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "snapshot-tests",
+    }
+})
+class SnapshotTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.create_rows(2)
+
+    def test_gzip_snapshot_matches_plain_snapshot(self):
+        plain = self.client.get("/en/api/courses/")
+        compressed = self.client.get(
+            "/en/api/courses/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(
+            json.loads(plain.content)[0]["category"]["name"], "Category 0")
+
+    def test_snapshot_is_rebuilt_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(content="Відгук", author="Новий автор")
+
+        # Only the service token lookup, the snapshot is already built.
+        self.assertEqual(self.count_queries("/uk/api/comments/"), 1)
+        authors = [
+            comment["author"]
+            for comment in self.client.get("/uk/api/comments/").json()
+        ]
+        self.assertIn("Новий автор", authors)
+
+    def test_version_bumped_while_rendering_keeps_no_stale_snapshot(self):
+        class WritingRenderer(JSONRenderer):
+            def render(self, data, *args, **kwargs):
+                # A write commits after the rows were read.
+                Comment.objects.create(
+                    content="Відгук", author="Новий автор")
+                bump_version(Comment)
+                return super().render(data, *args, **kwargs)
+
+        # The snapshot built by setUp is outdated, the request renders.
+        bump_version(Comment)
+        with mock.patch("main.snapshots.JSONRenderer", WritingRenderer):
+            self.client.get("/uk/api/comments/")
+        authors = [
+            comment["author"]
+            for comment in self.client.get("/uk/api/comments/").json()
+        ]
+        self.assertIn("Новий автор", authors)
+
+    def test_build_snapshots_command(self):
+        out = StringIO()
+        call_command("build_snapshots", stdout=out)
+        self.assertIn("teachers [en]", out.getvalue())
+        self.assertEqual(self.count_queries("/en/api/teachers/"), 1)
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "conditional-get-tests",
+    }
+})
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.create_rows(2)
+
+    def test_if_none_match_returns_not_modified(self):
+        course = Course.objects.earliest("pk")
+        for url in (
+            "/uk/api/courses/",
+            f"/uk/api/courses/{course.pk}/",
+            "/en/api/teachers/",
+            "/en/api/teachers/teacher-0/",
+            "/uk/api/categories/",
+            "/uk/api/comments/",
+            "/uk/api/medias/",
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                validators = {
+                    "HTTP_IF_NONE_MATCH": response["ETag"],
+                    "HTTP_IF_MODIFIED_SINCE": response["Last-Modified"],
+                }
+                for header, value in validators.items():
+                    conditional = self.client.get(url, **{header: value})
+                    self.assertEqual(conditional.status_code, 304)
+                    self.assertEqual(conditional.content, b"")
+
+    def test_validators_change_with_the_data(self):
+        etag = self.client.get("/uk/api/comments/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.first().delete()
+        self.assertEqual(
+            self.client.get(
+                "/uk/api/comments/", HTTP_IF_NONE_MATCH=etag).status_code,
+            200)
+
+    def test_last_modified_is_the_time_of_the_change(self):
+        last_modified = self.client.get("/uk/api/comments/")["Last-Modified"]
+        later = time.time() + 60
+        with mock.patch("main.cache.time.time", return_value=later), \
+                self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.first().delete()
+        response = self.client.get(
+            "/uk/api/comments/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Last-Modified"], http_date(later))
+
+    def test_changes_without_updated_time_change_the_etag(self):
+        etag = self.client.get("/uk/api/teachers/")["ETag"]
+        education = TeacherEducation.objects.first()
+        with translation.override("uk"), \
+                self.captureOnCommitCallbacks(execute=True):
+            education.education = "Магістр"
+            education.save()
+        self.assertEqual(
+            self.client.get(
+                "/uk/api/teachers/", HTTP_IF_NONE_MATCH=etag).status_code,
+            200)
+
+    def test_validators_depend_on_language_and_encoding(self):
+        etags = {
+            self.client.get("/uk/api/courses/")["ETag"],
+            self.client.get("/en/api/courses/")["ETag"],
+            self.client.get(
+                "/en/api/courses/", HTTP_ACCEPT_ENCODING="gzip")["ETag"],
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_not_modified_needs_no_query(self):
+        etag = self.client.get("/uk/api/teachers/")["ETag"]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                "/uk/api/teachers/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # The service token map and the versions are cached.
+        self.assertEqual(len(context.captured_queries), 0)
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "service-token-tests",
+    }
+})
+class ServiceAuthenticationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_invalid_tokens_are_rejected(self):
+        for header in ("Bearer wrong-token", "Bearer", "test-token"):
+            with self.subTest(header=header):
+                self.client.credentials(HTTP_AUTHORIZATION=header)
+                response = self.client.get("/uk/api/comments/")
+                self.assertEqual(response.status_code, 401)
+
+    def test_known_token_needs_no_query(self):
+        self.client.get("/uk/api/comments/")
+        with CaptureQueriesContext(connection) as context:
+            service = service_tokens.get("test-token")
+        self.assertEqual(service, self.service)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_new_token_invalidates_the_map(self):
+        self.client.get("/uk/api/comments/")
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceAdmin(Service, admin.site).generate_new_token(
+                None, Service.objects.all())
+
+        response = self.client.get("/uk/api/comments/")
+        self.assertEqual(response.status_code, 401)
+
+        self.service.refresh_from_db()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.service.token}")
+        self.assertEqual(self.client.get("/uk/api/comments/").status_code, 200)
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "throttle-tests",
+    }
+})
+class ServiceRateThrottleTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.service.read_rate = "2/min"
+        self.service.write_rate = "1/min"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.save()
+        self.now = 1000.0
+        patcher = mock.patch.object(
+            ServiceRateThrottle, "timer", lambda throttle: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_read_budget_is_exhausted(self):
+        for _ in range(2):
+            response = self.client.get("/uk/api/comments/")
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get("/uk/api/comments/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+    def test_tokens_are_refilled_over_time(self):
+        for _ in range(2):
+            self.client.get("/uk/api/comments/")
+        self.now += 30
+        self.assertEqual(self.client.get("/uk/api/comments/").status_code, 200)
+        self.assertEqual(self.client.get("/uk/api/comments/").status_code, 429)
+
+    def test_read_and_write_budgets_are_separate(self):
+        self.assertEqual(self.client.post("/uk/api/subscriptions/").status_code, 400)
+        self.assertEqual(self.client.post("/uk/api/subscriptions/").status_code, 429)
+        self.assertEqual(self.client.get("/uk/api/comments/").status_code, 200)
+
+    def test_zero_rates_are_rejected(self):
+        for rate in ("0/min", "00/s"):
+            self.service.read_rate = rate
+            with self.subTest(rate=rate), self.assertRaises(ValidationError):
+                self.service.full_clean()
+        self.service.read_rate = "10/min"
+        self.service.full_clean()
+
+    def test_default_rates_apply_without_service_rates(self):
+        self.service.read_rate = ""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.save()
+        rates = {"service_read": "1/min", "service_write": "1/min"}
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates):
+            self.assertEqual(
+                self.client.get("/uk/api/comments/").status_code, 200)
+            self.assertEqual(
+                self.client.get("/uk/api/comments/").status_code, 429)
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "warm-cache-tests",
+    }
+})
+class WarmCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.create_rows(2)
+        # Cached details vary on Accept, the site's is fetch()'s default.
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer test-token", HTTP_ACCEPT="*/*")
+
+    def warm_cache(self, *args):
+        out = StringIO()
+        call_command(
+            "warm_cache", "--host", "testserver", "--workers", "1", *args,
+            stdout=out)
+        return out.getvalue()
+
+    def test_every_endpoint_and_language_is_warmed(self):
+        output = self.warm_cache()
+        for line in ("courses list [uk]", "courses retrieve [en]",
+                     "teachers retrieve [uk]", "comments list [en]"):
+            self.assertIn(line, output)
+        # Comment details are not cached, so not warmed.
+        self.assertNotIn("comments retrieve", output)
+        self.assertIn("Warmed 32 of 32 requests", output)
+
+    def test_warmed_requests_need_no_query(self):
+        self.warm_cache()
+        course = Course.objects.earliest("pk")
+        media = MainPage.objects.earliest("pk")
+        for url in ("/uk/api/courses/", f"/en/api/courses/{course.pk}/",
+                    "/en/api/teachers/", "/uk/api/teachers/teacher-1/",
+                    f"/uk/api/medias/{media.pk}/"):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), 0)
+
+    def test_warming_is_not_throttled(self):
+        rates = {"service_read": "1/min", "service_write": "1/min"}
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates):
+            self.assertIn("Warmed 16 of 16", self.warm_cache("--language", "uk"))
+            self.assertEqual(
+                self.client.get("/uk/api/comments/").status_code, 200)
+
+    def test_site_service_is_required(self):
+        Service.objects.all().delete()
+        with self.assertRaises(CommandError):
+            self.warm_cache()
+
+    def test_default_host_skips_wildcards(self):
+        for hosts, host in [
+                ([None, "*", ".example.com"], "example.com"),
+                (["*"], "localhost"),
+                ([], "localhost")]:
+            with self.subTest(hosts=hosts), self.settings(ALLOWED_HOSTS=hosts):
+                self.assertEqual(get_default_host(), host)
+
+    def test_secure_requests_are_https(self):
+        request = WarmupRequest("/en/api/courses/", "testserver", True, {})
+        self.assertTrue(request.is_secure())
+        self.assertEqual(
+            request.build_absolute_uri(), "https://testserver/en/api/courses/")
+
+
+@override_settings(ROOT_URLCONF="main.tests")
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_rows(2)
+        self.course = Course.objects.earliest("pk")
+
+    async def get(self, url, token="test-token", **headers):
+        # AsyncClient sends extra keyword arguments as headers.
+        return await self.async_client.get(
+            url, authorization=f"Bearer {token}", **headers)
+
+    async def test_payloads_match_the_viewsets(self):
+        for url in (
+            "/uk/api/courses/",
+            "/en/api/courses/",
+            f"/uk/api/courses/{self.course.pk}/",
+            "/en/api/categories/",
+            "/en/api/teachers/",
+            "/en/api/teachers/teacher-0/",
+            "/uk/api/comments/",
+            "/uk/api/medias/",
+        ):
+            with self.subTest(url=url):
+                response = await self.get(url.replace("/api/", "/async/api/"))
+                self.assertEqual(response.status_code, 200)
+                expected = await sync_to_async(self.client.get)(url)
+                self.assertEqual(response.json(), expected.json())
+
+    async def test_gzip_list(self):
+        response = await self.get(
+            "/en/async/api/courses/", **{"accept-encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        payload = json.loads(gzip.decompress(response.content))
+        self.assertEqual(payload[0]["category"]["name"], "Category 0")
+
+    async def test_unknown_object_is_not_found(self):
+        for url in ("/uk/async/api/courses/0/",
+                    "/uk/async/api/courses/nope/",
+                    "/uk/async/api/teachers/nope/"):
+            with self.subTest(url=url):
+                response = await self.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {"detail": "Not found."})
+
+    async def test_invalid_token_is_rejected(self):
+        response = await self.get("/uk/async/api/comments/", "wrong-token")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], "Bearer")
+        response = await self.async_client.get("/uk/async/api/comments/")
+        self.assertEqual(response.status_code, 401)
+
+    async def test_other_services_are_forbidden(self):
+        await Service.objects.acreate(name="other", token="other-token")
+        response = await self.get("/uk/async/api/comments/", "other-token")
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "async-conditional-tests",
+        }
+    })
+    async def test_if_none_match_returns_not_modified(self):
+        # The ETags are made of the cache versions.
+        await sync_to_async(cache.clear)()
+        for url in ("/uk/async/api/teachers/",
+                    "/uk/async/api/teachers/teacher-1/"):
+            with self.subTest(url=url):
+                response = await self.get(url)
+                for header, value in [
+                        ("if-none-match", response["ETag"]),
+                        ("if-modified-since", response["Last-Modified"])]:
+                    conditional = await self.get(url, **{header: value})
+                    self.assertEqual(conditional.status_code, 304)
+
+    @override_settings(CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "async-throttle-tests",
+        }
+    })
+    async def test_read_budget_is_shared_with_the_viewsets(self):
+        await sync_to_async(cache.clear)()
+        rates = {"service_read": "2/min", "service_write": "1/min"}
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates):
+            response = await sync_to_async(self.client.get)(
+                "/uk/api/comments/")
+            self.assertEqual(response.status_code, 200)
+            response = await self.get("/uk/async/api/comments/")
+            self.assertEqual(response.status_code, 200)
+            response = await self.get("/uk/async/api/comments/")
+            self.assertEqual(response.status_code, 429)
+            self.assertIn("Retry-After", response)
+
+
+def make_image(width, height, image_format="JPEG", name="photo.jpg"):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(
+        buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=[320, 640])
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        media = override_settings(MEDIA_ROOT=directory)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.create_rows(1)
+        self.course = Course.objects.get()
+
+    def upload(self, instance, image):
+        instance.image = image
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        instance.refresh_from_db()
+        return instance.image_variants
+
+    def test_upload_builds_narrower_widths_and_webp(self):
+        variants = self.upload(self.course, make_image(1000, 500))
+
+        self.assertEqual((variants["width"], variants["height"]), (1000, 500))
+        self.assertEqual(
+            sorted((file["width"], file["type"]) for file in variants["files"]),
+            [(320, "image/jpeg"), (320, "image/webp"),
+             (640, "image/jpeg"), (640, "image/webp"),
+             (1000, "image/webp")])
+        for file in variants["files"]:
+            with Image.open(self.course.image.storage.path(file["name"])) as image:
+                self.assertEqual(image.width, file["width"])
+                self.assertEqual(image.get_format_mimetype(), file["type"])
+                self.assertEqual(
+                    os.path.dirname(file["name"]),
+                    os.path.dirname(self.course.image.name))
+
+    def test_small_image_gets_webp_only(self):
+        variants = self.upload(
+            Teacher.objects.get(), make_image(200, 300, "PNG", "face.png"))
+        self.assertEqual(
+            [(file["width"], file["type"]) for file in variants["files"]],
+            [(200, "image/webp")])
+
+    def test_api_exposes_srcsets(self):
+        self.upload(self.course, make_image(1000, 500))
+        sources = self.client.get(
+            f"/uk/api/courses/{self.course.pk}/").json()["image_sources"]
+
+        self.assertEqual((sources["width"], sources["height"]), (1000, 500))
+        webp, jpeg = sources["sources"]
+        self.assertEqual(webp["type"], "image/webp")
+        self.assertRegex(
+            webp["srcset"],
+            r"^http://testserver/media/images/\S+_320w\.webp 320w, "
+            r"\S+_640w\.webp 640w, \S+_1000w\.webp 1000w$")
+        self.assertTrue(jpeg["srcset"].endswith(
+            f"http://testserver{self.course.image.url} 1000w"))
+        listed = self.client.get("/uk/api/courses/").json()[0]
+        self.assertEqual(
+            listed["image_sources"]["sources"][0]["type"], "image/webp")
+
+    def test_replaced_image_is_queued_for_deletion(self):
+        old = self.upload(self.course, make_image(800, 600))
+        self.upload(self.course, make_image(700, 600))
+
+        self.assertEqual(len(self.course.image_variants["files"]), 5)
+        self.assertEqual(
+            sorted(AssetDeletion.objects.values_list(
+                "public_id", "resource_type")),
+            sorted([(old["source"], "image")] + [
+                (file["name"], "image") for file in old["files"]]))
+
+    def test_rebuilt_derivatives_keep_the_original(self):
+        old = self.upload(self.course, make_image(800, 600))
+        call_command("build_image_derivatives", "--force", stdout=StringIO())
+
+        self.assertEqual(
+            sorted(AssetDeletion.objects.values_list("public_id", flat=True)),
+            sorted(file["name"] for file in old["files"]))
+
+    def test_unreadable_image_keeps_the_original(self):
+        variants = self.upload(
+            self.course, SimpleUploadedFile("broken.jpg", b"not an image"))
+        self.assertEqual(variants["files"], [])
+        response = self.client.get(f"/uk/api/courses/{self.course.pk}/")
+        self.assertIsNone(response.json()["image_sources"])
+
+    def test_command_builds_missing_derivatives(self):
+        variants = self.upload(self.course, make_image(1000, 500))
+        Course.objects.update(image_variants={})
+
+        out = StringIO()
+        call_command("build_image_derivatives", stdout=out)
+
+        self.assertIn(
+            f"main.Course {self.course.pk}: {self.course.image.name}, "
+            f"5 derivatives", out.getvalue())
+        self.course.refresh_from_db()
+        self.assertEqual(
+            len(self.course.image_variants["files"]), len(variants["files"]))
+
+
+class MediaURLTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        storage_url.cache_clear()
+        resource_url.cache_clear()
+        self.create_rows(5)
+        for course in Course.objects.all():
+            Course.objects.filter(pk=course.pk).update(
+                image=f"images/course-{course.pk}.jpg")
+        patcher = mock.patch.object(
+            FileSystemStorage, "url", autospec=True,
+            side_effect=lambda storage, name: f"/media/{name}")
+        self.storage_url = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_serializers_resolve_each_file_once(self):
+        courses = Course.objects.all()
+        first = CourseSerializer(courses, many=True).data
+        second = CourseSerializer(courses, many=True).data
+
+        self.assertEqual(self.storage_url.call_count, 5)
+        self.assertEqual(
+            [course["image"] for course in second],
+            [f"/media/images/course-{course.pk}.jpg" for course in courses])
+        self.assertEqual(first, second)
+
+    def test_new_file_name_is_resolved(self):
+        course = Course.objects.first()
+        CourseSerializer(course).data
+        Course.objects.filter(pk=course.pk).update(image="images/new.jpg")
+        course.refresh_from_db()
+
+        self.assertEqual(
+            CourseSerializer(course).data["image"], "/media/images/new.jpg")
+        self.assertEqual(self.storage_url.call_count, 2)
+
+    def test_admin_thumbnails_resolve_each_file_once(self):
+        course_admin = CourseAdmin(Course, admin.site)
+        for _ in range(2):
+            thumbnails = [
+                course_admin.display_image(course)
+                for course in Course.objects.all()
+            ]
+        self.assertIn('src="/media/images/course-', thumbnails[0])
+        self.assertEqual(self.storage_url.call_count, 5)
+
+    def test_video_url_is_memoized(self):
+        main_page = MainPage.objects.first()
+        main_page.video = "video/upload/v1700000000/intro.mp4"
+        main_page.save()
+        main_page.refresh_from_db()
+        expected = "https://res.cloudinary.com/demo/video/upload/intro.mp4"
+
+        with mock.patch.object(
+                CloudinaryResource, "build_url",
+                autospec=True, return_value=expected) as build_url:
+            for _ in range(3):
+                self.assertEqual(
+                    MainPageSerializer(main_page).data["video"], expected)
+            self.assertIn(
+                expected,
+                MainPageAdmin(MainPage, admin.site).media_thumbnail(
+                    main_page))
+        self.assertEqual(build_url.call_count, 1)
+
+
+class FakeCloudinaryAPI:
+    """
+    Stand-in for the Admin API batch delete, holding the stored assets
+    as (resource type, public id) pairs.
+    """
+
+    def __init__(self, assets=(), delay=0):
+        self.assets = set(assets)
+        self.delay = delay
+        self.error = None
+        self.calls = []
+        self.running = self.most_running = 0
+        self.lock = threading.Lock()
+
+    def delete_resources(self, public_ids, resource_type="image", **options):
+        with self.lock:
+            self.calls.append((resource_type, list(public_ids)))
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            time.sleep(self.delay)
+            if self.error:
+                raise self.error
+            if len(public_ids) > 100:
+                raise ValueError("Too many public ids")
+            deleted = {}
+            with self.lock:
+                for public_id in public_ids:
+                    asset = (resource_type, public_id)
+                    deleted[public_id] = (
+                        "deleted" if asset in self.assets else "not_found")
+                    self.assets.discard(asset)
+            return {"deleted": deleted, "partial": False}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class AssetDeletionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_rows(2)
+        self.api = FakeCloudinaryAPI()
+        patcher = mock.patch(
+            "cloudinary.api.delete_resources", self.api.delete_resources)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def delete_assets(self, *args):
+        out = StringIO()
+        call_command("delete_assets", *args, stdout=out)
+        return out.getvalue()
+
+    def test_queryset_delete_queues_every_asset(self):
+        Course.objects.update(
+            image="images/course",
+            image_variants={"files": [
+                {"name": "images/course_320w", "width": 320,
+                 "type": "image/webp"},
+            ]})
+        MainPage.objects.update(video="video/upload/v1/videos/intro.mp4")
+        self.api.assets = {
+            ("image", "images/course"),
+            ("image", "images/course_320w"),
+            ("video", "videos/intro"),
+        }
+
+        # As the admin "delete selected" action does.
+        Course.objects.all().delete()
+        MainPage.objects.all().delete()
+        Teacher.objects.all().delete()
+
+        self.assertEqual(self.api.calls, [])
+        self.assertEqual(
+            sorted(AssetDeletion.objects.values_list(
+                "resource_type", "public_id")),
+            sorted([("image", "images/course")] * 2
+                   + [("image", "images/course_320w")] * 2
+                   + [("video", "videos/intro")] * 2
+                   + [("image", f"certificates/{i}-{j}.jpg")
+                      for i in range(2) for j in range(2)]))
+
+        self.assertIn("10 deleted, 0 failed", self.delete_assets())
+        self.assertEqual(self.api.assets, set())
+        self.assertEqual(
+            sorted(resource_type for resource_type, _ in self.api.calls),
+            ["image", "video"])
+        self.assertFalse(AssetDeletion.objects.exclude(
+            status=AssetDeletion.DELETED).exists())
+
+    def test_rolled_back_delete_queues_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Teacher.objects.all().delete()
+            raise RuntimeError
+        self.assertFalse(AssetDeletion.objects.exists())
+
+    def test_batches_are_chunked_and_bounded(self):
+        self.api.delay = 0.02
+        enqueue_deletions(
+            [(f"images/{i}", "image") for i in range(250)]
+            + [(f"videos/{i}", "video") for i in range(20)])
+
+        self.delete_assets("--workers", "2")
+
+        self.assertEqual(
+            sorted((resource_type, len(public_ids))
+                   for resource_type, public_ids in self.api.calls),
+            [("image", 50), ("image", 100), ("image", 100), ("video", 20)])
+        self.assertLessEqual(self.api.most_running, 2)
+        self.assertEqual(AssetDeletion.objects.filter(
+            status=AssetDeletion.DELETED).count(), 270)
+
+    def test_failed_call_is_retried_with_backoff(self):
+        deletion, = enqueue_deletions([("images/course", "image")])
+        self.api.error = ConnectionError("down")
+        with self.assertLogs("main.assets", "WARNING"):
+            self.delete_assets()
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AssetDeletion.PENDING)
+        self.assertEqual(deletion.attempts, 1)
+        self.assertEqual(deletion.last_error, "down")
+        self.assertGreater(deletion.next_attempt, timezone.now())
+
+        # Not due yet, then deleted once the API is back.
+        self.delete_assets()
+        self.assertEqual(len(self.api.calls), 1)
+        AssetDeletion.objects.update(next_attempt=timezone.now())
+        self.api.error = None
+        self.delete_assets()
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AssetDeletion.DELETED)
+        self.assertEqual(deletion.attempts, 2)
+
+
+@override_settings(ADMIN_EMAIL="admin@example.com", OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTests(APITestCase):
+    def send_outbox(self):
+        call_command("send_outbox", stdout=StringIO())
+
+    def test_contact_email_is_queued_with_the_contact(self):
+        response = self.client.post("/uk/api/contacts/", {
+            "name": "Олена",
+            "email": "olena@example.com",
+            "mobile_phone": "0501234567",
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Contact.objects.count(), 1)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.recipients, ["admin@example.com"])
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.send_outbox()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("olena@example.com", mail.outbox[0].body)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+
+    def test_welcome_email_is_queued_with_the_subscription(self):
+        response = self.client.post(
+            "/uk/api/subscriptions/", {"email": "reader@example.com"})
+        self.assertEqual(response.status_code, 201)
+        self.send_outbox()
+        self.assertEqual(mail.outbox[0].to, ["reader@example.com"])
+
+    def test_failed_send_is_retried_with_backoff(self):
+        email = enqueue_email("Subject", "Message", ["a@example.com"])
+        with mock.patch.object(
+                EmailMessage, "send", side_effect=SMTPException("down")), \
+                self.assertLogs("main.outbox", "WARNING"):
+            self.send_outbox()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, "down")
+        self.assertGreater(email.next_attempt, timezone.now())
+
+        # Not due yet, then given up after OUTBOX_MAX_ATTEMPTS.
+        self.send_outbox()
+        self.assertEqual(len(mail.outbox), 0)
+        OutboxEmail.objects.update(next_attempt=timezone.now())
+        with mock.patch.object(
+                EmailMessage, "send", side_effect=SMTPException("down")), \
+                self.assertLogs("main.outbox", "ERROR"):
+            self.send_outbox()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+
+    def test_claimed_emails_are_not_claimed_again(self):
+        enqueue_email("Subject", "Message", ["a@example.com"])
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+
+@override_settings(NEWSLETTER_BATCH_SIZE=2, NEWSLETTER_RATE=0)
+class NewsletterTests(TestCase):
+    def setUp(self):
+        SubscriptionEmail.objects.bulk_create(
+            SubscriptionEmail(email=f"reader{i}@example.com")
+            for i in range(5))
+        # The same address subscribed twice gets a single message.
+        SubscriptionEmail.objects.create(email="reader0@example.com")
+        TextEditor.objects.create(
+            title="News", content="<p>Hello</p>", is_selected=True)
+
+    def queue(self):
+        model_admin = SubscriptionEmailAdmin(SubscriptionEmail, admin.site)
+        with mock.patch.object(model_admin, "message_user"):
+            model_admin.send_custom_message(
+                mock.Mock(user=None), SubscriptionEmail.objects.all())
+        return Newsletter.objects.get()
+
+    def test_admin_action_only_queues_the_newsletter(self):
+        newsletter = self.queue()
+        self.assertEqual(newsletter.subject, "News")
+        self.assertEqual(newsletter.deliveries.count(), 5)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_one_message_per_recipient_and_connection_per_batch(self):
+        newsletter = self.queue()
+        with mock.patch(
+                "main.newsletter.get_connection",
+                wraps=get_connection) as connections:
+            call_command("send_newsletters", stdout=StringIO())
+        self.assertEqual(connections.call_count, 3)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [f"reader{i}@example.com" for i in range(5)])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], "<p>Hello</p>")
+        self.assertEqual(mail.outbox[0].body, "Hello")
+        newsletter.refresh_from_db()
+        self.assertEqual(newsletter.status, Newsletter.DONE)
+
+    def test_interrupted_send_resumes_with_remaining_recipients(self):
+        newsletter = self.queue()
+        send = EmailMessage.send
+        calls = []
+
+        def flaky_send(message):
+            calls.append(message)
+            if len(calls) == 3:
+                raise SMTPServerDisconnected("lost")
+            return send(message)
+
+        with mock.patch.object(EmailMessage, "send", flaky_send), \
+                self.assertLogs("main.management", "ERROR"):
+            call_command("send_newsletters", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        newsletter.refresh_from_db()
+        self.assertEqual(newsletter.status, Newsletter.SENDING)
+        # The interrupted delivery waits for its retry, the rest do not.
+        interrupted = newsletter.deliveries.get(
+            status=NewsletterDelivery.PENDING, attempts=1)
+        self.assertGreater(interrupted.next_attempt, timezone.now())
+        self.assertEqual(interrupted.error, "lost")
+
+        call_command("send_newsletters", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 4)
+        newsletter.refresh_from_db()
+        self.assertEqual(newsletter.status, Newsletter.SENDING)
+
+        interrupted.next_attempt = timezone.now()
+        interrupted.save()
+        call_command("send_newsletters", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            len({message.to[0] for message in mail.outbox}), 5)
+        newsletter.refresh_from_db()
+        self.assertEqual(newsletter.status, Newsletter.DONE)
+
+    @override_settings(NEWSLETTER_MAX_ATTEMPTS=2, NEWSLETTER_RETRY_DELAY=0)
+    def test_failing_delivery_is_given_up(self):
+        newsletter = self.queue()
+        send = EmailMessage.send
+
+        def failing_send(message):
+            if message.to == ["reader1@example.com"]:
+                raise ValueError("broken")
+            return send(message)
+
+        with mock.patch.object(EmailMessage, "send", failing_send), \
+                self.assertLogs("main", "ERROR"):
+            for _ in range(3):
+                call_command("send_newsletters", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 4)
+        delivery = newsletter.deliveries.get(email="reader1@example.com")
+        self.assertEqual(delivery.status, NewsletterDelivery.FAILED)
+        self.assertEqual(delivery.attempts, 2)
+        newsletter.refresh_from_db()
+        self.assertEqual(newsletter.status, Newsletter.DONE)
+
+    def test_claimed_deliveries_are_not_claimed_again(self):
+        newsletter = self.queue()
+        first = claim_deliveries(newsletter, 3)
+        second = claim_deliveries(newsletter, 3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({d.pk for d in first} & {d.pk for d in second})
+        self.assertEqual(claim_deliveries(newsletter, 3), [])
+
+    def test_failing_newsletter_does_not_stop_the_next(self):
+        self.queue()
+        queue_newsletter(
+            "Later", "<p>Later</p>", SubscriptionEmail.objects.all())
+        send = EmailMessage.send
+
+        def failing_send(message):
+            if message.subject == "News":
+                raise ValueError("broken")
+            return send(message)
+
+        with mock.patch.object(EmailMessage, "send", failing_send), \
+                self.assertLogs("main", "ERROR"):
+            call_command("send_newsletters", stdout=StringIO())
+        self.assertEqual(
+            [message.subject for message in mail.outbox], ["Later"] * 5)
+
+    def test_refused_recipient_is_recorded(self):
+        newsletter = self.queue()
+        refused = SMTPRecipientsRefused(
+            {"reader1@example.com": (550, b"No such user")})
+        send = EmailMessage.send
+
+        def refusing_send(message):
+            if message.to == ["reader1@example.com"]:
+                raise refused
+            return send(message)
+
+        with mock.patch.object(EmailMessage, "send", refusing_send):
+            call_command("send_newsletters", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 4)
+        delivery = newsletter.deliveries.get(email="reader1@example.com")
+        self.assertEqual(delivery.status, NewsletterDelivery.FAILED)
+
+    def test_sends_are_throttled(self):
+        self.queue()
+        with mock.patch("main.newsletter.time.sleep") as sleep:
+            call_command("send_newsletters", "--rate", "0.5",
+                         stdout=StringIO())
+        # Every message after the first waits about two seconds.
+        self.assertEqual(sleep.call_count, 4)
+        self.assertGreater(sleep.call_args[0][0], 1.5)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="manager")
+        Contact.objects.bulk_create(
+            Contact(
+                name=f"Client {i}",
+                email=f"client{i}@example.com",
+                mobile_phone=f"050{i:07}",
+                updated_by=self.user if i % 2 else None,
+            )
+            for i in range(5))
+        self.model_admin = ContactAdmin(Contact, admin.site)
+
+    def read_csv(self, content):
+        return list(csv.reader(StringIO(content)))
+
+    def test_csv_is_streamed_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = export_to_csv(
+                self.model_admin, None, Contact.objects.order_by("pk"))
+            content = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        rows = self.read_csv(content)
+        self.assertEqual(len(rows), 6)
+        header = rows[0]
+        first = dict(zip(header, rows[1]))
+        second = dict(zip(header, rows[2]))
+        self.assertEqual(first["Ім'я"], "Client 0")
+        self.assertEqual(first["Обновив(ла)"], "")
+        self.assertEqual(second["Обновив(ла)"], "manager")
+        self.assertEqual(
+            first["Час створення"], timezone.now().strftime("%d/%m/%Y"))
+
+    def test_gzip_export_matches_plain_export(self):
+        queryset = Contact.objects.order_by("pk")
+        plain = b"".join(
+            export_to_csv(self.model_admin, None, queryset).streaming_content)
+        response = export_to_csv_gzip(self.model_admin, None, queryset)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response["Content-Disposition"].endswith(".csv.gz"))
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)), plain)
+
+
+class BackupTests(TransactionTestCase):
+    # The backup waits for the write transaction TestCase keeps open.
+    def setUp(self):
+        self.user = User.objects.create(username="admin", is_staff=True)
+        Contact.objects.create(
+            name="Client", email="client@example.com", mobile_phone="0500")
+
+    def test_backup_requires_staff(self):
+        response = self.client.get(reverse("create_backup"))
+        self.assertEqual(response.status_code, 302)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite backup")
+    def test_backup_streams_a_gzipped_database_snapshot(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("create_backup"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "backup.sqlite3")
+            with open(path, "wb") as backup:
+                backup.write(gzip.decompress(b"".join(response)))
+            database = sqlite3.connect(path)
+            try:
+                (count,) = database.execute(
+                    "SELECT count(*) FROM main_contact").fetchone()
+            finally:
+                database.close()
+        self.assertEqual(count, 1)
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL backup")
+    def test_backup_streams_a_gzipped_sql_dump(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("create_backup"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(".sql.gz", response["Content-Disposition"])
+        dump = gzip.decompress(b"".join(response)).decode()
+        self.assertIn("CREATE TABLE public.main_contact", dump)
+        self.assertIn("client@example.com", dump)
+
+    def test_backup_archive_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for action in ("create", "verify"):
+                stdout = StringIO()
+                call_command(
+                    "backup_archive", "--archive", directory, action,
+                    stdout=stdout)
+            self.assertIn(": ok", stdout.getvalue())
+
+
+class BackupArchiveTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.archive = BackupArchive(os.path.join(self.directory, "archive"))
+        self.database = os.path.join(self.directory, "db.sqlite3")
+        self.write_database(range(2000))
+
+    def write_database(self, rows):
+        database = sqlite3.connect(self.database)
+        with database:
+            database.execute(
+                "CREATE TABLE IF NOT EXISTS row (id INTEGER PRIMARY KEY, "
+                "value TEXT)")
+            database.executemany(
+                "INSERT OR REPLACE INTO row VALUES (?, ?)",
+                ((i, os.urandom(64).hex()) for i in rows))
+        database.close()
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_unchanged_chunks_are_stored_once(self):
+        first = self.archive.add(self.database, "first")
+        self.assertEqual(first["new_chunks"], len(first["chunks"]))
+        self.write_database([0])
+        second = self.archive.add(self.database, "second")
+        self.assertGreater(len(second["chunks"]), 2)
+        self.assertEqual(second["new_chunks"], 1)
+
+        size, stored = self.archive.stats()
+        self.assertEqual(size, first["size"] + second["size"])
+        self.assertLess(stored, first["size"])
+
+    def test_restore_and_verify(self):
+        self.archive.add(self.database, "first")
+        expected = self.read(self.database)
+        self.write_database([0])
+        self.archive.add(self.database, "second")
+
+        target = os.path.join(self.directory, "restored.sqlite3")
+        self.archive.restore("first", target)
+        self.assertEqual(self.read(target), expected)
+        self.archive.verify("second")
+
+    def test_corrupted_chunk_is_detected(self):
+        manifest = self.archive.add(self.database, "first")
+        with open(self.archive.chunk_path(manifest["chunks"][1]), "wb") as f:
+            f.write(zlib.compress(b"garbage"))
+        with self.assertRaises(ArchiveError):
+            self.archive.verify("first")
+
+    def test_sql_dump_chunks_survive_inserted_lines(self):
+        rng = random.Random(0)
+        lines = [
+            f"{i}\t{rng.getrandbits(256):x}\n".encode()
+            for i in range(20000)
+        ]
+        dump = os.path.join(self.directory, "dump.sql")
+        with open(dump, "wb") as f:
+            f.writelines(lines)
+        first = self.archive.add(dump, "first", "sql")
+        with open(dump, "wb") as f:
+            f.writelines(lines[:100] + [b"inserted\n"] + lines[100:])
+        second = self.archive.add(dump, "second", "sql")
+
+        self.assertEqual(first["new_chunks"], len(first["chunks"]))
+        self.assertGreater(len(second["chunks"]), 10)
+        self.assertEqual(second["new_chunks"], 1)
+        target = os.path.join(self.directory, "restored.sql")
+        self.archive.restore("first", target)
+        self.assertEqual(self.read(target), b"".join(lines))
+        self.assertEqual(self.archive.verify("second")["format"], "sql")
+
+    def test_prune_removes_unused_chunks(self):
+        self.archive.add(self.database, "first")
+        self.write_database([0])
+        second = self.archive.add(self.database, "second")
+
+        removed, removed_chunks = self.archive.prune(keep_last=1, keep_daily=0)
+        self.assertEqual(removed, ["first"])
+        self.assertEqual(removed_chunks, 1)
+        self.assertEqual(self.archive.snapshots(), ["second"])
+        self.assertEqual(second["sha256"], self.archive.verify("second")[
+            "sha256"])
+
+    def test_prune_keeps_the_newest_snapshot_of_each_day(self):
+        today = datetime(2024, 5, 10, 12, tzinfo=dt_timezone.utc)
+        with mock.patch("main.archive.datetime") as clock:
+            for days_ago, name in [
+                    (3, "day-3"), (2, "day-2"), (1, "day-1"),
+                    (0, "early"), (0, "late")]:
+                clock.now.return_value = today - timedelta(days=days_ago)
+                self.archive.add(self.database, name)
+
+            clock.now.return_value = today
+            self.archive.prune(keep_last=0, keep_daily=2)
+            self.assertEqual(self.archive.snapshots(), ["day-1", "late"])
+            self.archive.prune(keep_last=0, keep_daily=1)
+            self.assertEqual(self.archive.snapshots(), ["late"])
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite pragmas")
+class DatabaseProfileTests(TestCase):
+    def test_pragmas_are_set_on_new_connections(self):
+        with connection.cursor() as cursor:
+            for name in ("busy_timeout", "cache_size"):
+                cursor.execute(f"PRAGMA {name}")
+                self.assertEqual(
+                    cursor.fetchone()[0], settings.SQLITE_PRAGMAS[name])
+
+
+class TieredCacheTests(SimpleTestCase):
+    def create_worker(self, name):
+        cache = TieredCache(name, {
+            "OPTIONS": {
+                "LOCAL_MAX_ENTRIES": 10,
+                "LOCAL_BYPASS_PREFIXES": ["api-version."],
+                "SHARED": {
+                    "BACKEND":
+                        "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "tiered-cache-tests-shared",
+                },
+            },
+        })
+        cache.clear()
+        cache.reset_stats()
+        return cache
+
+    def setUp(self):
+        self.worker = self.create_worker("worker-1")
+        self.other_worker = self.create_worker("worker-2")
+
+    def test_shared_hit_is_promoted_to_the_local_tier(self):
+        self.other_worker.set("key", "value")
+
+        self.assertEqual(self.worker.get("key"), "value")
+        self.assertEqual(self.worker.get("key"), "value")
+        stats = self.worker.stats()
+        self.assertEqual(stats["shared_hits"], 1)
+        self.assertEqual(stats["local_hits"], 1)
+
+    def test_writes_and_deletes_go_through(self):
+        self.worker.set("key", "value")
+        self.assertEqual(self.worker.shared.get("key"), "value")
+
+        self.worker.delete("key")
+        self.assertIsNone(self.worker.get("key"))
+        self.assertIsNone(self.other_worker.get("key"))
+
+    def test_bypassed_keys_are_seen_by_every_worker(self):
+        self.worker.set("api-version.main.course", "a")
+        self.assertEqual(self.other_worker.get("api-version.main.course"), "a")
+
+        self.worker.set("api-version.main.course", "b")
+        self.assertEqual(self.other_worker.get("api-version.main.course"), "b")
+        self.assertEqual(self.other_worker.stats()["local_hits"], 0)
+
+    def test_local_tier_is_bounded(self):
+        for i in range(50):
+            self.worker.set(f"key-{i}", i)
+        self.assertLessEqual(self.worker.stats()["local_entries"], 10)
+        self.assertEqual(self.worker.get("key-0"), 0)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = SQLiteCache(os.path.join(directory, "cache.sqlite3"), {
+            "OPTIONS": {
+                "MAX_ENTRIES": 10,
+                "CULL_FREQUENCY": 5,
+                "ACCESS_RESOLUTION": 0,
+            },
+        })
+
+    def entries(self):
+        return self.cache._connection.execute(
+            "SELECT entries FROM cache_stats").fetchone()[0]
+
+    def test_basic_operations(self):
+        self.cache.set("key", {"value": 1})
+        self.assertEqual(self.cache.get("key"), {"value": 1})
+        self.assertFalse(self.cache.add("key", "other"))
+        self.assertTrue(self.cache.add("new", 1))
+        self.assertEqual(self.cache.incr("new", 2), 3)
+        self.assertEqual(
+            self.cache.get_many(["key", "new", "missing"]),
+            {"key": {"value": 1}, "new": 3})
+        self.assertTrue(self.cache.delete("key"))
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_expired_entries(self):
+        self.cache.set("key", 1, timeout=0)
+        self.assertFalse(self.cache.has_key("key"))
+        self.assertTrue(self.cache.add("key", 2))
+        self.assertEqual(self.cache.get("key"), 2)
+
+    def test_cull_evicts_expired_then_least_recently_used(self):
+        self.cache.set("expired", 1, timeout=0)
+        for i in range(9):
+            self.cache.set(f"key-{i}", i)
+        time.sleep(0.01)
+        self.cache.get("key-0")
+
+        self.cache.set("key-9", 9)
+        self.cache.set("key-10", 10)
+
+        self.assertFalse(self.cache.has_key("expired"))
+        self.assertEqual(self.cache.get("key-0"), 0)
+        self.assertFalse(self.cache.has_key("key-1"))
+        self.assertLessEqual(self.entries(), 10)
+        self.assertEqual(
+            self.entries(),
+            self.cache._connection.execute(
+                "SELECT COUNT(*) FROM cache").fetchone()[0])
+
+
+class BenchmarkReportTests(SimpleTestCase):
+    def test_latencies_are_reported_in_the_unit(self):
+        times = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(
+            format_latencies(times, "ms").split(),
+            ["p50", "50.5ms", "p99", "100.0ms", "max", "100.0ms"])
@@ -0,0 +1,92 @@
+import math
+import time
+
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import Service
+
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    Return the (requests, seconds) of a "600/min" style rate.
+    """
+    requests, period = rate.split("/")
+    seconds = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}[period[0]]
+    return int(requests), seconds
+
+
+class ServiceRateThrottle(BaseThrottle):
+    """
+    Token bucket per authenticated Service, with separate read and write
+    budgets.
+
+    The budgets come from ``Service.read_rate``/``write_rate`` or else the
+    ``service_read``/``service_write`` DEFAULT_THROTTLE_RATES. A budget of
+    N/period holds N tokens refilled at N per period, so a service may burst
+    its whole budget at once and then sustains the rate.
+
+    The bucket is stored as the time it would be full again (GCRA), a single
+    float under ``throttle.<service>.<scope>`` in the shared cache, so every
+    request costs one cache get and one set and no query. The read and the
+    write are not atomic, concurrent workers may let a request or two above
+    the budget through.
+    """
+
+    cache_alias = "default"
+    key_prefix = "throttle"
+    timer = time.time
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_scope(self, method):
+        return "read" if method in READ_METHODS else "write"
+
+    def get_rate(self, service, scope):
+        rate = getattr(service, f"{scope}_rate", "")
+        if not rate:
+            rate = api_settings.DEFAULT_THROTTLE_RATES.get(f"service_{scope}")
+        return rate
+
+    def allow_request(self, request, view):
+        return self.allow_service(request.user, request.method)
+
+    def allow_service(self, service, method):
+        if not isinstance(service, Service):
+            return True
+        scope = self.get_scope(method)
+        rate = self.get_rate(service, scope)
+        if not rate:
+            return True
+
+        requests, seconds = parse_rate(rate)
+        interval = seconds / requests
+        cache = caches[self.cache_alias]
+        key = f"{self.key_prefix}.{service.pk}.{scope}"
+        now = self.timer()
+        full_at = max(cache.get(key) or now, now) + interval
+        allowed_at = full_at - seconds
+        if now < allowed_at:
+            self.retry_after = allowed_at - now
+            return False
+        cache.set(key, full_at, math.ceil(full_at - now))
+        return True
+
+    async def aallow_request(self, service, method):
+        # The bucket is never kept in a local cache tier, so its get and
+        # set both go to the shared cache, in one trip to a thread.
+        return await sync_to_async(
+            self.allow_service, thread_sensitive=False)(service, method)
+
+    def wait(self):
+        return self.retry_after
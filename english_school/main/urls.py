@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
 from . import views
+from .async_views import AsyncReadView
+from .snapshots import SnapshotListMixin
 
 
 router = routers.DefaultRouter()
@@ -13,9 +16,29 @@ router.register(r"medias", views.MainPageViewSet)
 router.register(r"contacts", views.ContactViewSet)
 router.register(r"subscriptions", views.SubscriptionEmailViewSet)
 router.register(r"teachers", views.TeacherViewSet)
+router.register(r"search", views.SearchViewSet, basename="search")
+
+# Async list/retrieve of the read endpoints, ahead of the router when
+# API_ASYNC_VIEWS is on.
+async_urlpatterns = []
+for prefix, viewset, basename in router.registry:
+    if issubclass(viewset, SnapshotListMixin):
+        async_urlpatterns += [
+            path(
+                f"api/{prefix}/",
+                AsyncReadView.as_view(viewset=viewset),
+                name=f"async-{prefix}-list"),
+            path(
+                f"api/{prefix}/<str:lookup>/",
+                AsyncReadView.as_view(viewset=viewset, detail=True),
+                name=f"async-{prefix}-detail"),
+        ]
 
 urlpatterns = [
     path("api/", include(router.urls)),
     path("", views.index, name="index"),
     path("create_backup/", views.create_backup, name="create_backup"),
 ]
+
+if settings.API_ASYNC_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
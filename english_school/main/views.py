@@ -1,16 +1,14 @@
-import os
 import logging
-import subprocess
 
 from datetime import datetime
 
 from django.urls import reverse
 from django.conf import settings
-from django.http import HttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.db import transaction
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.core.mail import send_mail, BadHeaderError
 from django.utils.translation import gettext_lazy as _
 
 from rest_framework import viewsets, status
@@ -22,8 +20,12 @@ from .models import (
     Comment,
     MainPage,
     Contact,
+    SearchEntry,
     SubscriptionEmail,
-    Teacher
+    Teacher,
+    TeacherCertificate,
+    TeacherEducation,
+    TeacherNote
 )
 from .serializers import (
     CategorySerializer,
@@ -34,6 +36,11 @@ from .serializers import (
     SubscriptionEmailSerializer,
     TeacherSerializer
 )
+from .backup import stream_backup
+from .cache import cache_response, conditional_response
+from .outbox import enqueue_email
+from .search import get_search_limit, search
+from .snapshots import SnapshotListMixin
 from .authentication import (
     ServiceOnlyAuthentication,
     ServiceOnlyAuthorizationSite
@@ -47,137 +54,81 @@ from .mail_messsage_generator import (
 logger = logging.getLogger(__name__)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SnapshotListMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     authentication_classes = [ServiceOnlyAuthentication]
     permission_classes = [ServiceOnlyAuthorizationSite]
     http_method_names = ['get']
+    snapshot_models = [Category]
 
-    @method_decorator(cache_page(60 * 30))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    def get_queryset(self):
+        return super().get_queryset().prefetch_translations()
 
-    @method_decorator(cache_page(60 * 30))
+    @method_decorator(conditional_response(Category))
+    @method_decorator(cache_response(Category))
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
 
-class MainPageCourseViewSet(viewsets.ModelViewSet):
+class MainPageCourseViewSet(SnapshotListMixin, viewsets.ModelViewSet):
     queryset = Course.objects.filter(
         available=True,
         main_page=True,
-        )
+        ).select_related("category")
     serializer_class = CourseSerializer
     authentication_classes = [ServiceOnlyAuthentication]
     permission_classes = [ServiceOnlyAuthorizationSite]
     http_method_names = ['get']
+    snapshot_models = [Course, Category]
 
-    @method_decorator(cache_page(60 * 30))
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(
-            queryset, many=True, context={"request": request}
-        )
-        data = serializer.data
-
-        for item in data:
-            course_id = item["id"]
-            course = Course.objects.get(pk=course_id)
-            category = course.category
-            category_serializer = CategorySerializer(
-                category, context={"request": request}
-            )
-            item["category"] = category_serializer.data
-
-        return Response(data)
+    def get_queryset(self):
+        return super().get_queryset().prefetch_translations("category")
 
-    @method_decorator(cache_page(60 * 30))
+    @method_decorator(conditional_response(Course, Category))
+    @method_decorator(cache_response(Course, Category))
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(
-            instance,
-            context={"request": request})
-        data = serializer.data
-
-        category = instance.category
-        category_serializer = CategorySerializer(
-            category, context={"request": request}
-        )
-        data["category"] = category_serializer.data
-
-        return Response(data)
+        return super().retrieve(request, *args, **kwargs)
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(SnapshotListMixin, viewsets.ModelViewSet):
     queryset = Course.objects.filter(
         available=True
-        )
+        ).select_related("category")
     serializer_class = CourseSerializer
     authentication_classes = [ServiceOnlyAuthentication]
     permission_classes = [ServiceOnlyAuthorizationSite]
     http_method_names = ['get']
+    snapshot_models = [Course, Category]
 
-    @method_decorator(cache_page(60 * 30))
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(
-            queryset, many=True, context={"request": request}
-        )
-        data = serializer.data
-
-        for item in data:
-            course_id = item["id"]
-            course = Course.objects.get(pk=course_id)
-            category = course.category
-            category_serializer = CategorySerializer(
-                category, context={"request": request}
-            )
-            item["category"] = category_serializer.data
+    def get_queryset(self):
+        return super().get_queryset().prefetch_translations("category")
 
-        return Response(data)
-
-    @method_decorator(cache_page(60 * 30))
+    @method_decorator(conditional_response(Course, Category))
+    @method_decorator(cache_response(Course, Category))
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(
-            instance,
-            context={"request": request})
-        data = serializer.data
-
-        category = instance.category
-        category_serializer = CategorySerializer(
-            category, context={"request": request}
-        )
-        data["category"] = category_serializer.data
-
-        return Response(data)
+        return super().retrieve(request, *args, **kwargs)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SnapshotListMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     authentication_classes = [ServiceOnlyAuthentication]
     permission_classes = [ServiceOnlyAuthorizationSite]
     http_method_names = ['get']
-
-    @method_decorator(cache_page(60 * 30))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    snapshot_models = [Comment]
 
 
-class MainPageViewSet(viewsets.ModelViewSet):
+class MainPageViewSet(SnapshotListMixin, viewsets.ModelViewSet):
     queryset = MainPage.objects.filter(available=True)
     serializer_class = MainPageSerializer
     authentication_classes = [ServiceOnlyAuthentication]
     permission_classes = [ServiceOnlyAuthorizationSite]
     http_method_names = ['get']
+    snapshot_models = [MainPage]
 
-    @method_decorator(cache_page(60 * 30))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-
-    @method_decorator(cache_page(60 * 30))
+    @method_decorator(conditional_response(MainPage))
+    @method_decorator(cache_response(MainPage))
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(
@@ -200,29 +151,21 @@ class ContactViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
 
-        # Send email
+        # Queue the email, send_outbox delivers it
         time_now = datetime.now()
         formatted_datetime = time_now.strftime("%d.%m.%Y - %H:%M")
         subject = _("Форму з сайту заповнив клієнт")
-        name = serializer.data.get('name', "-")
-        email = serializer.data.get('email', "-")
-        mobile_phone = serializer.data.get('mobile_phone', "-")
-        description = serializer.data.get('description', "-")
-        message = contact_form_message(
-            formatted_datetime, name, email, mobile_phone, description
-            )
-
-        from_email = settings.DEFAULT_FROM_EMAIL
-        recipient_list = [settings.ADMIN_EMAIL]
-
-        try:
-            send_mail(subject, message, from_email, recipient_list)
-        except BadHeaderError as e:
-            logger.error(f"Invalid header found: {e}")
-        except Exception as e:
-            logger.error(f">>> Failed to send email: {e}")
+        with transaction.atomic():
+            self.perform_create(serializer)
+            name = serializer.data.get('name', "-")
+            email = serializer.data.get('email', "-")
+            mobile_phone = serializer.data.get('mobile_phone', "-")
+            description = serializer.data.get('description', "-")
+            message = contact_form_message(
+                formatted_datetime, name, email, mobile_phone, description
+                )
+            enqueue_email(subject, message, [settings.ADMIN_EMAIL])
 
         headers = self.get_success_headers(serializer.data)
         return Response(
@@ -249,9 +192,7 @@ class SubscriptionEmailViewSet(viewsets.ModelViewSet):
                     {'detail': _('Ця електронна адреса вже підписана.')},
                     status=status.HTTP_400_BAD_REQUEST)
 
-            SubscriptionEmail.objects.create(email=email)
-
-            # Send email
+            # Queue the email, send_outbox delivers it
             subject = _(
                 "Ласкаво просимо до Bright Language School інформаційну підписку!"
                 )
@@ -259,15 +200,9 @@ class SubscriptionEmailViewSet(viewsets.ModelViewSet):
                 email,
                 )
 
-            from_email = settings.DEFAULT_FROM_EMAIL
-            recipient_list = [email]
-
-            try:
-                send_mail(subject, message, from_email, recipient_list)
-            except BadHeaderError as e:
-                logger.error(f"Invalid header found: {e}")
-            except Exception as e:
-                logger.error(f">>> Failed to send email: {e}")
+            with transaction.atomic():
+                SubscriptionEmail.objects.create(email=email)
+                enqueue_email(subject, message, [email])
 
             return Response(
                 {'detail': 'You successfully subscribe for newsletters.'},
@@ -276,16 +211,113 @@ class SubscriptionEmailViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TeacherViewSet(viewsets.ModelViewSet):
+class TeacherViewSet(SnapshotListMixin, viewsets.ModelViewSet):
     queryset = Teacher.objects.all()
     serializer_class = TeacherSerializer
     authentication_classes = [ServiceOnlyAuthentication]
     permission_classes = [ServiceOnlyAuthorizationSite]
     http_method_names = ['get']
+    snapshot_models = [
+        Teacher,
+        TeacherEducation,
+        TeacherNote,
+        TeacherCertificate,
+        ]
+    lookup_field = "slug"
+
+    def get_queryset(self):
+        # Teachers, their educations and notes with translations, and
+        # certificates: a fixed number of queries for any staff size.
+        return super().get_queryset().prefetch_translations(
+            "teacher_educations",
+            "teacher_notes"
+        ).prefetch_related("teacher_certificates")
+
+    @method_decorator(conditional_response(
+        Teacher, TeacherEducation, TeacherNote, TeacherCertificate))
+    @method_decorator(cache_response(
+        Teacher, TeacherEducation, TeacherNote, TeacherCertificate))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-    @method_decorator(cache_page(60 * 30))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+
+SEARCH_MODELS = [
+    SearchEntry,
+    Course,
+    Category,
+    Teacher,
+    TeacherEducation,
+    TeacherNote,
+    TeacherCertificate,
+]
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    Courses and teachers whose names, descriptions and positions match
+    ``q`` in any language, best first, each as ``{"type", "score",
+    "object"}`` with the object as its own endpoint serializes it.
+    ``type`` narrows the search to courses or teachers, ``limit`` caps the
+    results (SEARCH_MAX_RESULTS at most).
+    """
+
+    authentication_classes = [ServiceOnlyAuthentication]
+    permission_classes = [ServiceOnlyAuthorizationSite]
+    http_method_names = ['get']
+    search_viewsets = {
+        SearchEntry.COURSE: CourseViewSet,
+        SearchEntry.TEACHER: TeacherViewSet,
+    }
+
+    @method_decorator(conditional_response(*SEARCH_MODELS))
+    @method_decorator(cache_response(*SEARCH_MODELS))
+    def list(self, request):
+        kinds = list(self.search_viewsets)
+        kind = request.query_params.get("type")
+        if kind:
+            if kind not in self.search_viewsets:
+                return Response(
+                    {'detail': 'Unknown type, expected one of: {}.'.format(
+                        ', '.join(self.search_viewsets))},
+                    status=status.HTTP_400_BAD_REQUEST)
+            kinds = [kind]
+        views = {
+            kind: self.search_viewsets[kind](
+                request=request, format_kwarg=None, action="list")
+            for kind in kinds
+        }
+        # Only the rows each endpoint serves can match, so unavailable
+        # courses never take a place within the limit.
+        matches = search(
+            request.query_params.get("q", ""),
+            {kind: view.get_queryset() for kind, view in views.items()},
+            get_search_limit(request.query_params.get("limit")),
+        )
+        objects = self.get_objects(views, matches)
+        return Response([
+            {"type": kind, "score": score, "object": objects[kind][pk]}
+            for kind, pk, score in matches
+            # Deleted since the search.
+            if pk in objects[kind]
+        ])
+
+    def get_objects(self, views, matches):
+        """
+        Return the serialized matches by type and pk, loaded by the view
+        of their type in one batch each.
+        """
+        objects = {}
+        for kind, view in views.items():
+            pks = [
+                pk for match_kind, pk, score in matches if match_kind == kind]
+            objects[kind] = {}
+            if not pks:
+                continue
+            rows = list(view.get_queryset().filter(pk__in=pks))
+            data = view.get_serializer(rows, many=True).data
+            objects[kind] = {
+                obj.pk: item for obj, item in zip(rows, data)}
+        return objects
 
 
 def index(request):
@@ -300,35 +332,20 @@ def index(request):
     return render(request, "main/index.html", context)
 
 
+@staff_member_required
 def create_backup(request):
-    db_path = settings.DATABASES.get("default").get("NAME")
-
     time_now = datetime.now()
     time_now_str = time_now.strftime("%Y-%m-%d-%H-%M")
-    backup_filename = f"{time_now_str}_backup.sql"
-
-    sqlite3_path = "/usr/bin/sqlite3"
 
     try:
-        try:
-            subprocess.run(
-                f"{sqlite3_path} {db_path} .dump > {backup_filename}",
-                shell=True, check=True)
-        except subprocess.CalledProcessError as e:
-            return HttpResponse(
-                f"Error create buackup: {e}", status=500)
-        else:
-            with open(backup_filename, "rb") as backup_file:
-                response = HttpResponse(
-                    backup_file.read(), content_type="application/sql")
-                response["Content-Disposition"] = f'attachment; filename="{backup_filename}"'
+        content, extension = stream_backup()
     except Exception as e:
-        response = HttpResponse(str(e), content_type="text/plain")
-
-    try:
-        if os.path.exists(backup_filename):
-            os.remove(backup_filename)
-    except Exception:
-        ...
-
+        logger.error(f">>> Failed to create backup: {e}")
+        return HttpResponse(
+            f"Error create backup: {e}", status=500)
+
+    backup_filename = f"{time_now_str}_backup.{extension}.gz"
+    response = StreamingHttpResponse(
+        content, content_type="application/gzip")
+    response["Content-Disposition"] = f'attachment; filename="{backup_filename}"'
     return response
@@ -0,0 +1,150 @@
+import time
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils import translation
+
+from rest_framework.mixins import RetrieveModelMixin
+
+from .authentication import get_site_service_name
+from .models import Service
+from .snapshots import SnapshotListMixin
+
+
+WarmupTarget = namedtuple(
+    "WarmupTarget", ["prefix", "viewset", "language", "action", "kwargs"])
+
+WarmupResult = namedtuple(
+    "WarmupResult", ["target", "status", "elapsed"])
+
+
+def get_default_host():
+    """
+    Return the first host of ALLOWED_HOSTS a request can be made to, or
+    "localhost" when there is none (no hosts or only wildcards).
+    """
+    for host in settings.ALLOWED_HOSTS:
+        # ".example.com" also matches example.com.
+        host = (host or "").lstrip(".")
+        if host and host != "*":
+            return host
+    return "localhost"
+
+
+class WarmupRequest(HttpRequest):
+    """
+    A GET request built by hand, as the WSGI handler would build it.
+    """
+
+    def __init__(self, path, host, secure, headers):
+        super().__init__()
+        self.method = "GET"
+        self.path = self.path_info = path
+        self.secure = secure
+        self.META.update({
+            "SERVER_NAME": host,
+            "SERVER_PORT": "443" if secure else "80",
+            "HTTP_HOST": host,
+            **{f"HTTP_{name}": value for name, value in headers.items()},
+        })
+
+    def _get_scheme(self):
+        return "https" if self.secure else "http"
+
+
+def get_warmup_targets(languages):
+    """
+    Return the list and the cached detail requests of every routed read
+    viewset, in every language of ``languages``.
+    """
+    from .urls import router
+
+    targets = []
+    for prefix, viewset, basename in router.registry:
+        if not issubclass(viewset, SnapshotListMixin):
+            continue
+        lookups = []
+        # Details are only worth warming where retrieve is cached.
+        if viewset.retrieve is not RetrieveModelMixin.retrieve:
+            view = viewset(request=None, format_kwarg=None, action="list")
+            lookups = list(view.get_queryset().values_list(
+                viewset.lookup_field, flat=True))
+        lookup_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        for language in languages:
+            targets.append(
+                WarmupTarget(prefix, viewset, language, "list", {}))
+            targets += [
+                WarmupTarget(prefix, viewset, language, "retrieve",
+                             {lookup_kwarg: str(lookup)})
+                for lookup in lookups
+            ]
+    return targets
+
+
+class CacheWarmer:
+    """
+    Fill the API caches by running the read views the way a request of the
+    site service does, without the throttle.
+
+    Lists fill their snapshot and details their ``cache_response`` entry,
+    along the way the service token map and the cache versions the ETags
+    are made of are filled too. Cached details are keyed by the host and
+    the Accept header, so these must be the ones the site sends.
+    """
+
+    def __init__(self, host, secure=False, accept="*/*"):
+        self.host = host
+        self.secure = secure
+        self.accept = accept
+        self.token = Service.objects.get(name=get_site_service_name()).token
+
+    def get_path(self, target):
+        with translation.override(target.language):
+            path = f"{reverse('api-root')}{target.prefix}/"
+        for lookup in target.kwargs.values():
+            path += f"{lookup}/"
+        return path
+
+    def warm(self, target):
+        started = time.perf_counter()
+        request = WarmupRequest(
+            self.get_path(target), self.host, self.secure, {
+                "ACCEPT": self.accept,
+                "AUTHORIZATION": f"Bearer {self.token}",
+            })
+        view = target.viewset.as_view(
+            {"get": target.action}, throttle_classes=[])
+        with translation.override(target.language):
+            request.LANGUAGE_CODE = target.language
+            response = view(request, **target.kwargs)
+            # cache_response stores the response once it is rendered.
+            if not getattr(response, "is_rendered", True):
+                response.render()
+        return WarmupResult(
+            target, response.status_code, time.perf_counter() - started)
+
+    def warm_share(self, targets):
+        try:
+            return [self.warm(target) for target in targets]
+        finally:
+            # Worker threads' connections are not closed by any request.
+            connections.close_all()
+
+    def run(self, targets, workers=4):
+        """
+        Warm ``targets`` from ``workers`` threads, lists first. Returns
+        the WarmupResults.
+        """
+        targets = sorted(targets, key=lambda target: target.action != "list")
+        if workers <= 1:
+            return [self.warm(target) for target in targets]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            shares = executor.map(
+                self.warm_share,
+                [targets[i::workers] for i in range(workers)])
+            return [result for share in shares for result in share]